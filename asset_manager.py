@@ -0,0 +1,105 @@
+# asset_manager.py
+# Every image goes through here: each (path, size, flags) combination is
+# loaded, converted and scaled once, then the same surface is handed out to
+# every sprite that asks for it. Treat the returned surfaces as read-only.
+from collections import OrderedDict
+
+import pygame
+
+from settings import SCREEN_WIDTH, SCREEN_HEIGHT, GUN_ROTATION_STEP, ROTATION_CACHE_SIZE
+from simulation import LEVEL_PLATFORMS, LEVEL_WALLS, PLAYER_SIZE, BULLET_SIZE, WALK_FRAMES
+
+# Flags
+ALPHA = 1   # convert_alpha() instead of convert()
+FLIP_X = 2  # mirrored horizontally
+
+PLAYER_FOLDERS = ["assets/player1", "assets/player2"]
+
+_cache = {}
+
+
+def walk_frame_paths(folder):
+    return [f"{folder}/walk_{i}.png" for i in range(WALK_FRAMES)]
+
+
+def load(path, size=None, flags=ALPHA):
+    key = (path, size, flags)
+    surface = _cache.get(key)
+    if surface is not None:
+        return surface
+
+    if flags & FLIP_X:
+        surface = pygame.transform.flip(load(path, size, flags & ~FLIP_X), True, False)
+    elif size is not None:
+        surface = pygame.transform.scale(load(path, None, flags), size)
+    else:
+        surface = pygame.image.load(path)
+        surface = surface.convert_alpha() if flags & ALPHA else surface.convert()
+    _cache[key] = surface
+    return surface
+
+
+def build_manifest():
+    # Everything a match draws, so preloading leaves nothing to decode mid-game
+    manifest = [
+        ("assets/heart.png", (20, 20), ALPHA),
+        ("assets/bullet_icon.png", (20, 20), ALPHA),
+        ("assets/bullet_projectile.png", BULLET_SIZE, ALPHA),
+        ("assets/jungle_bg.png", (SCREEN_WIDTH, SCREEN_HEIGHT), 0),
+        ("assets/cursor.png", (48, 48), ALPHA),
+        ("assets/gun.png", (70, 28), ALPHA),
+        ("assets/dash_ready.png", (40, 40), ALPHA),
+        ("assets/dash_cooldown.png", (40, 40), ALPHA),
+    ]
+    manifest += [("assets/platform.png", (w, h), ALPHA) for x, y, w, h in LEVEL_PLATFORMS]
+    manifest += [("assets/wall.png", (w, h), ALPHA) for x, y, w, h in LEVEL_WALLS]
+    for folder in PLAYER_FOLDERS:
+        for flags in (ALPHA, ALPHA | FLIP_X):
+            manifest += [(path, PLAYER_SIZE, flags) for path in walk_frame_paths(folder)]
+    return manifest
+
+
+MANIFEST = build_manifest()
+
+
+def preload(manifest=MANIFEST):
+    # Needs a display mode, surfaces are converted to its pixel format
+    for path, size, flags in manifest:
+        load(path, size, flags)
+
+
+def clear():
+    _cache.clear()
+
+
+class RotationCache:
+    # Rotated copies of one image at angles rounded to `step` degrees, with
+    # the offset from the rotation center to the top-left corner. The least
+    # recently used angles are dropped once max_size are cached.
+    def __init__(self, image, step=GUN_ROTATION_STEP, max_size=ROTATION_CACHE_SIZE):
+        self.image = image
+        self.step = step
+        self.max_size = max_size
+        self.rotations = OrderedDict()  # quantized angle -> (surface, offset)
+
+    def get(self, angle):
+        key = round(angle / self.step) * self.step % 360
+        entry = self.rotations.get(key)
+        if entry is not None:
+            self.rotations.move_to_end(key)
+            return entry
+
+        surface = pygame.transform.rotate(self.image, key)
+        entry = (surface, (-(surface.get_width() // 2), -(surface.get_height() // 2)))
+        self.rotations[key] = entry
+        if len(self.rotations) > self.max_size:
+            self.rotations.popitem(last=False)
+        return entry
+
+    def prebake(self):
+        for i in range(min(self.max_size, round(360 / self.step))):
+            self.get(i * self.step)
+
+    def blit(self, surface, angle, center):
+        rotated, (dx, dy) = self.get(angle)
+        return surface.blit(rotated, (center[0] + dx, center[1] + dy))
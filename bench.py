@@ -0,0 +1,259 @@
+# bench.py
+# Microbenchmarks for the hot paths: framing, message encoding, player and
+# bullet simulation and a full client frame. Results go to a JSON file that
+# a later run can be compared against:
+#   SDL_VIDEODRIVER=dummy python bench.py --output before.json
+#   SDL_VIDEODRIVER=dummy python bench.py --compare before.json
+import argparse
+import gc
+import json
+import os
+import pickle
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pygame
+
+import codec
+import protocol
+import settings
+from bullet_engine import BulletEngine
+from client import GameClient
+from level import create_level
+from match import simulate
+from player import Player
+
+BULLET_COUNTS = (10, 100, 1000)
+
+
+def timed(func, number):
+    # Seconds for `number` calls, with the garbage collector off like timeit
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - started
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def measure(func, repeat, min_time):
+    # Calls per repeat are doubled until one repeat takes min_time, the first
+    # (calibration) runs double as warm-up. Times are per call, in seconds.
+    number = 1
+    while True:
+        elapsed = timed(func, number)
+        if elapsed >= min_time:
+            break
+        number *= 2
+    times = [timed(func, number) / number for _ in range(repeat)]
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if repeat > 1 else 0.0,
+    }
+
+
+def state_payload(player, bullet_count=5):
+    # What a relay client sends: Player.get_data() plus its bullets and a timestamp
+    data = player.get_data()
+    data["bullets"] = [{"id": i, "x": 100 + i * 30, "y": 200, "target": (640.0, 360.0), "source_id": 0}
+                       for i in range(bullet_count)]
+    data["time"] = 123456
+    return data
+
+
+def free_positions(count, blocks, avoid, seed=0):
+    # Bullet top-lefts that overlap neither the level nor `avoid`, so
+    # collision tests run in full without removing anything
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        box = pygame.Rect(rng.randrange(0, settings.SCREEN_WIDTH - 20), rng.randrange(0, settings.SCREEN_HEIGHT - 20),
+                          20, 20)
+        if not box.colliderect(avoid) and not any(box.colliderect(block) for block in blocks):
+            positions.append(box.topleft)
+    return positions
+
+
+class Benchmarks:
+    # Each bench_* method sets up its state and returns {name: zero-argument callable}
+    def __init__(self):
+        self.client = GameClient()
+        self.client.player_id = "0"
+        self.client.create_players()
+        self.platforms, self.walls, self.blocks = create_level()
+        self.sizes = {}  # encoded message bytes, filled in by bench_codec
+
+    def bench_protocol(self):
+        left, right = socket.socketpair()
+        sender, receiver = protocol.Protocol(left), protocol.Protocol(right)
+        cases = {}
+        for bullet_count in (0, 20):
+            message = codec.encode_state(state_payload(self.client.local_player, bullet_count))
+
+            def round_trip(message=message):
+                sender.send_data(message)
+                receiver.get_data()
+
+            cases[f"protocol/send_get_{len(message)}B"] = round_trip
+        return cases
+
+    def bench_codec(self):
+        data = state_payload(self.client.local_player)
+        encoded = {
+            "pickle": pickle.dumps(data),
+            "json": json.dumps(data).encode(),
+            "codec": codec.encode_state(data),
+        }
+        self.sizes.update({f"codec/{name}": len(raw) for name, raw in encoded.items()})
+        return {
+            "codec/pickle_encode": lambda: pickle.dumps(data),
+            "codec/pickle_decode": lambda: pickle.loads(encoded["pickle"]),
+            "codec/json_encode": lambda: json.dumps(data).encode(),
+            "codec/json_decode": lambda: json.loads(encoded["json"]),
+            "codec/codec_encode": lambda: codec.encode_state(data),
+            "codec/codec_decode": lambda: codec.decode_state(encoded["codec"]),
+            "codec/check_state": lambda: codec.check_state(encoded["codec"]),
+        }
+
+    def bench_match(self):
+        # A second of match time with random inputs, stepped without a clock
+        rng = random.Random(0)
+
+        def policy(match):
+            return [{"seq": match.tick, "buttons": rng.choice((0, 1, 2, 5, 6, 8, 16, 17, 18)),
+                     "gun_angle": rng.uniform(-180, 180)} for _ in match.players]
+
+        return {f"match/simulate_{settings.TICK_RATE}_ticks": lambda: simulate(settings.TICK_RATE, policy)}
+
+    def bench_player(self):
+        player = Player(150, 100, "assets/player1/walk_0.png",
+                        {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w, "dash": pygame.K_LSHIFT})
+        # Walk right, jump, walk left, dash: a second of each
+        keys = []
+        for pressed in ((pygame.K_d,), (pygame.K_d, pygame.K_w), (pygame.K_a,), (pygame.K_a, pygame.K_LSHIFT)):
+            state = defaultdict(bool, {key: True for key in pressed})
+            keys += [state] * settings.TICK_RATE
+        frame = [0]
+
+        def update():
+            player.update(self.blocks, keys[frame[0] % len(keys)])
+            frame[0] += 1
+
+        return {"player/update": update}
+
+    def bench_bullets(self):
+        # Bullets at rest in open space: every call moves and tests all of them
+        target = self.client.enemy_player
+        cases = {}
+        for count in BULLET_COUNTS:
+            positions = free_positions(count, self.blocks, target.rect)
+            engine = BulletEngine(self.blocks)
+            for x, y in positions:
+                engine.spawn(x + 10, y + 10, (x + 10, y + 10), 0)
+
+            def batched(engine=engine):
+                engine.step()
+                engine.collide([(1, target.sim)])
+
+            cases[f"bullets/engine_{count}"] = batched
+        return cases
+
+    def bench_draw(self):
+        client = self.client
+        for x, y in free_positions(20, self.blocks, client.local_player.rect, seed=1):
+            client.bullets.spawn(x + 10, y + 10, (x + 10, y + 10), 0)
+        client.enemy_bullets_data = [{"x": x, "y": y} for x, y in free_positions(20, self.blocks,
+                                                                                 client.enemy_player.rect, seed=2)]
+
+        def full():
+            client.full_redraw = True
+            client.draw()
+
+        def dirty():
+            settings.DIRTY_RECTS = True
+            try:
+                client.draw()
+            finally:
+                settings.DIRTY_RECTS = False
+
+        return {"draw/full_frame": full, "draw/dirty_frame": dirty}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    benchmarks = Benchmarks()
+    results = {}
+    for attr in sorted(dir(benchmarks)):
+        if not attr.startswith("bench_"):
+            continue
+        for name, func in getattr(benchmarks, attr)().items():
+            if args.filter and not any(pattern in name for pattern in args.filter):
+                continue
+            results[name] = measure(func, args.repeat, args.min_time)
+            print(f"{name:28} {results[name]['median'] * 1e6:10.2f} us  "
+                  f"(min {results[name]['min'] * 1e6:.2f}, stdev {results[name]['stdev'] * 1e6:.2f})")
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "min_time": args.min_time,
+        },
+        "sizes": benchmarks.sizes,
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    # Ratio of medians, below 1 is faster than the baseline
+    print(f"\nagainst {baseline['meta'].get('commit')}:")
+    for name, result in report["results"].items():
+        old = baseline["results"].get(name)
+        if old:
+            print(f"{name:28} {old['median'] * 1e6:10.2f} -> {result['median'] * 1e6:10.2f} us  "
+                  f"x{result['median'] / old['median']:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=7, help="timed repeats per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per repeat, at least")
+    parser.add_argument("--filter", nargs="*", help="only benchmarks whose name contains one of these")
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", help="earlier results to compare against")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    report = run(args)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,183 @@
+# bullet_engine.py
+import math
+
+import numpy as np
+
+from settings import SCREEN_WIDTH, SCREEN_HEIGHT
+from simulation import BULLET_SIZE, BULLET_STEP, to_int
+
+INITIAL_CAPACITY = 64
+
+FIELDS = (
+    ("x", np.float64),   # whole pixels, what collides and is drawn
+    ("y", np.float64),
+    ("fx", np.float64),  # exact position, x and y round it
+    ("fy", np.float64),
+    ("vx", np.float64),
+    ("vy", np.float64),
+    ("prev_x", np.float64),  # position before the last step, for drawing between ticks
+    ("prev_y", np.float64),
+    ("target_x", np.float64),
+    ("target_y", np.float64),
+    ("source", np.int8),
+    ("ids", np.uint16),
+    ("seq", np.int64),
+    ("spawn_tick", np.int64),
+    ("active", bool),
+)
+
+
+def round_half_away(values):
+    # Same rounding as simulation.to_int, for whole arrays
+    return np.where(values >= 0, np.floor(values + 0.5), -np.floor(0.5 - values))
+
+
+def overlapping(xs, ys, rect, size=BULLET_SIZE):
+    # Which bullet boxes at (xs, ys) overlap rect, strict like colliderect
+    w, h = size
+    return (xs < rect.x + rect.w) & (rect.x < xs + w) & (ys < rect.y + rect.h) & (rect.y < ys + h)
+
+
+class BulletEngine:
+    # Every bullet of a match as struct-of-arrays. Moving, culling and hit
+    # tests run as a few NumPy operations over all slots instead of a Python
+    # object per bullet, dead slots go back on a free list for the next shot.
+    def __init__(self, blocks, capacity=INITIAL_CAPACITY):
+        self.blocks = np.array([tuple(block) for block in blocks], dtype=np.float64).reshape(-1, 4)
+        self.next_id = 0   # lets the receiver match bullets across snapshots
+        self.next_seq = 0  # spawn order, snapshots list bullets in it
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        self.capacity = capacity
+        for name, dtype in FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.free = list(range(capacity - 1, -1, -1))
+        self.count = 0
+
+    def grow(self):
+        # Double every array, live slots keep their index
+        old = self.capacity
+        self.capacity *= 2
+        for name, dtype in FIELDS:
+            values = np.zeros(self.capacity, dtype=dtype)
+            values[:old] = getattr(self, name)
+            setattr(self, name, values)
+        self.free = list(range(self.capacity - 1, old - 1, -1))
+
+    def clear(self):
+        self.active[:] = False
+        self.free = list(range(self.capacity - 1, -1, -1))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, x, y, target, source_id, tick=0):
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+
+        w, h = BULLET_SIZE
+        self.x[slot] = to_int(x) - w // 2
+        self.y[slot] = to_int(y) - h // 2
+        self.fx[slot], self.fy[slot] = self.x[slot], self.y[slot]
+        self.prev_x[slot], self.prev_y[slot] = self.x[slot], self.y[slot]
+        dx, dy = target[0] - x, target[1] - y
+        length = math.hypot(dx, dy)
+        if length != 0:
+            self.vx[slot], self.vy[slot] = dx / length * BULLET_STEP, dy / length * BULLET_STEP
+        else:
+            self.vx[slot], self.vy[slot] = 0, 0
+        self.target_x[slot], self.target_y[slot] = target
+        self.source[slot] = int(source_id)
+        self.ids[slot] = self.next_id & 0xFFFF
+        self.seq[slot] = self.next_seq
+        self.spawn_tick[slot] = tick
+        self.active[slot] = True
+        self.next_id += 1
+        self.next_seq += 1
+        self.count += 1
+        return slot
+
+    def release(self, slots):
+        self.active[slots] = False
+        self.free.extend(int(slot) for slot in slots)
+        self.count -= len(slots)
+
+    def slots(self):
+        return np.flatnonzero(self.active)
+
+    def step(self):
+        slots = self.slots()
+        if not len(slots):
+            return
+        self.prev_x[slots], self.prev_y[slots] = self.x[slots], self.y[slots]
+        self.fx[slots] += self.vx[slots]
+        self.fy[slots] += self.vy[slots]
+        xs = self.x[slots] = round_half_away(self.fx[slots])
+        ys = self.y[slots] = round_half_away(self.fy[slots])
+
+        # Remove if off screen
+        w, h = BULLET_SIZE
+        off = (xs + w < 0) | (xs > SCREEN_WIDTH) | (ys + h < 0) | (ys > SCREEN_HEIGHT)
+        self.release(slots[off])
+
+    def collide(self, targets):
+        # targets are (player id, player) pairs. Bullets stop at the level or
+        # at the first enemy they overlap, players never take more than one
+        # hit per call. Returns the players that lost their last life.
+        slots = self.slots()
+        if not len(slots):
+            return []
+
+        xs, ys = self.x[slots, None], self.y[slots, None]
+        bx, by, bw, bh = self.blocks.T
+        w, h = BULLET_SIZE
+        hit_level = ((xs < bx + bw) & (bx < xs + w) & (ys < by + bh) & (by < ys + h)).any(axis=1)
+        self.release(slots[hit_level])
+        slots = slots[~hit_level]
+
+        losers = []
+        for player_id, player in targets:
+            if not player.alive:
+                continue
+            hits = slots[overlapping(self.x[slots], self.y[slots], player.rect)
+                         & (self.source[slots] != player_id)]
+            if not len(hits):
+                continue
+            first = hits[np.argmin(self.seq[hits])]
+            self.release([first])
+            slots = slots[slots != first]
+            if player.take_hit():
+                losers.append(player)
+        return losers
+
+    def ordered_slots(self):
+        slots = self.slots()
+        return slots[np.argsort(self.seq[slots])]
+
+    def positions(self, alpha=1.0):
+        # alpha < 1 draws between the previous and the current tick
+        slots = self.ordered_slots()
+        xs, ys = self.x[slots], self.y[slots]
+        if alpha < 1:
+            xs = round_half_away(self.prev_x[slots] + (xs - self.prev_x[slots]) * alpha)
+            ys = round_half_away(self.prev_y[slots] + (ys - self.prev_y[slots]) * alpha)
+        return list(zip(xs.astype(int).tolist(), ys.astype(int).tolist()))
+
+    def get_data(self):
+        slots = self.ordered_slots()
+        return [
+            {
+                "id": bullet_id,
+                "x": x,
+                "y": y,
+                "target": (tx, ty),
+                "source_id": source_id,
+            }
+            for bullet_id, x, y, tx, ty, source_id in zip(
+                self.ids[slots].tolist(), self.x[slots].astype(int).tolist(),
+                self.y[slots].astype(int).tolist(), self.target_x[slots].tolist(),
+                self.target_y[slots].tolist(), self.source[slots].tolist())
+        ]
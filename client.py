@@ -1,12 +1,23 @@
 import pygame
-import pickle
 import settings
-from level import create_level
+import asset_manager
+import hud
+from level import create_level, LevelLayer
 from player import Player
-from bullet import Bullet
 import socket
 import protocol
+import codec
+import network
 import math
+import time
+from collections import deque
+from match import step_player
+from bullet_engine import BulletEngine, overlapping
+import numpy as np
+from interpolation import SnapshotBuffer
+from profiler import FrameProfiler
+from timestep import FixedTimestep
+from replay import Recorder
 
 class GameClient:
     def __init__(self):
@@ -19,6 +30,18 @@ class GameClient:
         self.setup_game()
         self.enemy_frame = 0
         self.enemy_bullets_data = []
+        self.authoritative = False
+        self.input_seq = 0
+        self.fire_pending = False
+        self.reset_pending = False
+        self.network = None
+        self.next_send = 0
+        self.enemy_snapshots = SnapshotBuffer()
+        self.input_history = deque(maxlen=settings.INPUT_HISTORY_SIZE)
+        self.profiler = FrameProfiler()
+        self.timestep = FixedTimestep()
+        self.recorder = None
+        self.sim_tick = 0  # ticks run locally, numbers the client's recording
 
 
 
@@ -30,14 +53,17 @@ class GameClient:
             print(f"Connected to server as Player {self.player_id}")
 
             print("Waiting for a second player...")
-            start_signal = self.pro.get_data().decode()
-            if start_signal != "start":
+            start_signal = self.pro.get_data().decode().split()
+            if not start_signal or start_signal[0] != "start":
                 print("Unexpected server response. Exiting.")
                 self.running = False
                 return
             else:
                 print("Both players connected. Game starting!")
                 self.connected = True
+                self.authoritative = "auth" in start_signal[1:]
+                # Relayed states carry no acks, so there is no RTT to measure
+                self.profiler.measures_rtt = self.authoritative
 
             pygame.init()
             pygame.mouse.set_visible(False)
@@ -46,84 +72,181 @@ class GameClient:
             self.clock = pygame.time.Clock()
             pygame.display.set_caption(f"Platform Duel-{self.player_id}")
 
-            if self.player_id == "0":
-                self.local_player = Player(150, 100, "assets/player1/walk_0.png",
-                                           {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
-                                            "dash": pygame.K_LSHIFT})
-                self.local_player.name = "Player 1"
-                self.enemy_player = Player(1050, 100, "assets/player2/walk_0.png",
-                                           {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
-                                            "dash": pygame.K_LSHIFT})
-                self.enemy_player.name = "Player 2"
-                self.enemy_player.gun_angle = 0
-            elif self.player_id == "1":
-                self.local_player = Player(1050, 100, "assets/player2/walk_0.png",
-                                           {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
-                                            "dash": pygame.K_LSHIFT})
-                self.local_player.name = "Player 2"
-                self.enemy_player = Player(150, 100, "assets/player1/walk_0.png",
-                                           {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
-                                            "dash": pygame.K_LSHIFT})
-                self.enemy_player.name = "Player 1"
-                self.enemy_player.gun_angle = 0
+            self.create_players()
 
+            # Relay snapshots supersede each other, inputs must all arrive
+            udp_address, token = None, None
+            if "udp" in start_signal[1:]:
+                udp_address, token = (settings.SERVER_IP, settings.PORT), int(start_signal[-1])
+            self.network = network.NetworkClient(self.pro, coalesce=not self.authoritative,
+                                                 udp_address=udp_address, token=token)
+            self.network.start()
+            if settings.RECORD_REPLAY:
+                self.recorder = Recorder(settings.RECORD_REPLAY)
 
         except Exception as e:
             print(f"Failed to connect to server: {e}")
             self.running = False
 
+    def create_players(self):
+        # Player 0 starts on the left, player 1 on the right
+        if self.player_id == "0":
+            self.local_player = Player(150, 100, "assets/player1/walk_0.png",
+                                       {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
+                                        "dash": pygame.K_LSHIFT})
+            self.local_player.name = "Player 1"
+            self.enemy_player = Player(1050, 100, "assets/player2/walk_0.png",
+                                       {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
+                                        "dash": pygame.K_LSHIFT})
+            self.enemy_player.name = "Player 2"
+            self.enemy_player.gun_angle = 0
+        elif self.player_id == "1":
+            self.local_player = Player(1050, 100, "assets/player2/walk_0.png",
+                                       {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
+                                        "dash": pygame.K_LSHIFT})
+            self.local_player.name = "Player 2"
+            self.enemy_player = Player(150, 100, "assets/player1/walk_0.png",
+                                       {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
+                                        "dash": pygame.K_LSHIFT})
+            self.enemy_player.name = "Player 1"
+            self.enemy_player.gun_angle = 0
+
     def send_and_receive_data(self):
+        # Never blocks: messages go out through the network threads and we
+        # pick up whatever the server sent most recently. Authoritative
+        # inputs go out once per tick from step_simulation.
+        if not self.authoritative and time.monotonic() >= self.next_send:
+            # Remote players are interpolated, so snapshots can go out
+            # well below the frame rate
+            interval = 1 / settings.NET_SEND_RATE
+            self.next_send = max(self.next_send, time.monotonic() - interval) + interval
+            self.send_state()
+        self.receive_messages()
+        self.sample_enemy()
+
+    def send_state(self):
         player_data = self.local_player.get_data()
-        bullet_data = [b.get_data() for b in self.bullets]
+        bullet_data = self.bullets.get_data()
         player_data["bullets"] = bullet_data
+        player_data["time"] = pygame.time.get_ticks()
 
         # 🔁 Send game over info if it happened
         if self.game_over:
             player_data["game_over"] = self.winner
 
-        self.pro.send_data(pickle.dumps(player_data))
+        self.network.send(codec.encode_state(player_data))
+
+    def receive_messages(self):
+        messages = self.network.drain()
+        if not messages and not self.network.connected:
+            print("Lost connection to the server. Exiting game.")
+            self.running = False
+            return
+
+        for received_at, msg_type, data in messages:
+            if msg_type == codec.MSG_QUIT:
+                print("Opponent quit. Exiting game.")
+                self.profiler.dump()
+                self.stop_recording()
+                pygame.quit()
+                exit()
 
-        # Receive enemy data as a flat dictionary
-        enemy_data = pickle.loads(self.pro.get_data())
+            if msg_type == codec.MSG_WORLD:
+                self.apply_world(data, received_at)
 
-        if enemy_data == "quit":
-            print("Opponent quit. Exiting game.")
-            pygame.quit()
-            exit()
+            if msg_type == codec.MSG_STATE:
+                # Receive enemy data as a flat dictionary
+                self.enemy_snapshots.add(data["time"] / 1000, data, received_at)
+                if "game_over" in data and not self.game_over:
+                    self.winner = data["game_over"]
+                    self.game_over = True
 
-        if len(enemy_data) != 0:
-            self.enemy_player.rect.y = enemy_data["y"]
-            self.enemy_player.rect.x = enemy_data["x"]
-            self.enemy_player.lives = enemy_data["lives"]
-            self.enemy_player.ammo = enemy_data["ammo"]
-            self.enemy_frame = enemy_data["image"]
-            self.enemy_player.facing_right = enemy_data["facing_right"]
-            self.enemy_player.gun_angle = enemy_data["gun_angle"]
-            self.enemy_bullets_data = enemy_data.get("bullets", [])
-            self.enemy_player.can_dash = enemy_data.get("can_dash", True)
-            self.enemy_player.alive = enemy_data.get("alive", True)
-            self.enemy_player.respawn_timer = enemy_data.get("respawn_timer", 0)
-            if "game_over" in enemy_data and not self.game_over:
-                self.winner = enemy_data["game_over"]
-                self.game_over = True
+    def sample_enemy(self):
+        enemy_data = self.enemy_snapshots.sample(time.monotonic())
+        if enemy_data is None:
+            return
+        self.enemy_player.set_data(enemy_data)
+        self.enemy_frame = enemy_data["image"]
+        self.enemy_bullets_data = enemy_data.get("bullets", [])
 
+    def get_input_buttons(self):
+        keys = pygame.key.get_pressed()
+        controls = self.local_player.controls
+        buttons = 0
+        if keys[controls["left"]]:
+            buttons |= codec.INPUT_LEFT
+        if keys[controls["right"]]:
+            buttons |= codec.INPUT_RIGHT
+        if keys[controls["jump"]]:
+            buttons |= codec.INPUT_JUMP
+        if controls.get("dash") and keys[controls["dash"]]:
+            buttons |= codec.INPUT_DASH
+        if self.fire_pending:
+            buttons |= codec.INPUT_FIRE
+        if self.reset_pending:
+            buttons |= codec.INPUT_RESET
+        self.fire_pending = False
+        self.reset_pending = False
+        return buttons
+
+    def send_input(self):
+        # The server owns the simulation, we only send what the player pressed
+        self.input_seq += 1
+        buttons = self.get_input_buttons()
+        self.network.send_input(self.input_seq, buttons, self.local_player.get_gun_angle())
+
+        if settings.CLIENT_PREDICTION and not self.game_over:
+            # Apply the input right away instead of waiting for the server
+            self.input_history.append((self.input_seq, buttons))
+            step_player(self.local_player.sim, self.collision_blocks, buttons)
+            self.local_player.refresh_image()
+
+    def reconcile(self, server_data, ack):
+        # Rewind to the server's state and replay what it hasn't processed yet
+        while self.input_history and self.input_history[0][0] <= ack:
+            self.input_history.popleft()
+        self.local_player.set_data(server_data)
+        for seq, buttons in self.input_history:
+            step_player(self.local_player.sim, self.collision_blocks, buttons)
+        self.local_player.refresh_image()
+
+    def apply_world(self, world, received_at):
+        local_id = int(self.player_id)
+        was_alive = self.local_player.alive
+        if settings.CLIENT_PREDICTION:
+            self.reconcile(world["players"][local_id], world["ack"])
+        else:
+            self.local_player.set_data(world["players"][local_id])
+        if self.local_player.alive and not was_alive:
+            self.local_player.snap()  # the server respawned us between ticks
+        # Every bullet comes from the server, the local group stays empty
+        enemy_data = dict(world["players"][1 - local_id], bullets=world["bullets"])
+        self.enemy_snapshots.add(world["tick"] / settings.TICK_RATE, enemy_data, received_at)
+        self.game_over = "game_over" in world
+        self.winner = world.get("game_over")
 
 
     def load_assets(self):
         self.screen = pygame.display.set_mode((settings.SCREEN_WIDTH, settings.SCREEN_HEIGHT))
         pygame.display.set_caption("Platform Duel")
-        self.heart_img = pygame.transform.scale(pygame.image.load("assets/heart.png").convert_alpha(), (20, 20))
-        self.bullet_img = pygame.transform.scale(pygame.image.load("assets/bullet_icon.png").convert_alpha(), (20, 20))
-        self.bullet_projectile = pygame.transform.scale(pygame.image.load("assets/bullet_projectile.png").convert_alpha(), (20, 20))
-        self.background = pygame.transform.scale(pygame.image.load("assets/jungle_bg.png").convert(), (settings.SCREEN_WIDTH, settings.SCREEN_HEIGHT))
-        self.cursor_img = pygame.transform.scale(pygame.image.load("assets/cursor.png").convert_alpha(), (48, 48))
-        self.gun_img = pygame.transform.scale(pygame.image.load("assets/gun.png").convert_alpha(), (70, 28))
-        self.dash_icon_ready = pygame.transform.scale(pygame.image.load("assets/dash_ready.png").convert_alpha(), (40, 40))
-        self.dash_icon_cooldown = pygame.transform.scale(pygame.image.load("assets/dash_cooldown.png").convert_alpha(), (40, 40))
+        asset_manager.preload()
+        self.heart_img = asset_manager.load("assets/heart.png", (20, 20))
+        self.bullet_img = asset_manager.load("assets/bullet_icon.png", (20, 20))
+        self.bullet_projectile = asset_manager.load("assets/bullet_projectile.png", (20, 20))
+        self.background = asset_manager.load("assets/jungle_bg.png", (settings.SCREEN_WIDTH, settings.SCREEN_HEIGHT), 0)
+        self.cursor_img = asset_manager.load("assets/cursor.png", (48, 48))
+        self.gun_img = asset_manager.load("assets/gun.png", (70, 28))
+        self.gun_rotations = asset_manager.RotationCache(self.gun_img)
+        self.dash_icon_ready = asset_manager.load("assets/dash_ready.png", (40, 40))
+        self.dash_icon_cooldown = asset_manager.load("assets/dash_cooldown.png", (40, 40))
+        self.hud = hud.Hud(self.heart_img, self.bullet_img, self.dash_icon_ready, self.dash_icon_cooldown)
 
     def setup_game(self):
-        self.platforms, self.walls = create_level()
-        self.bullets = pygame.sprite.Group()
+        self.platforms, self.walls, self.collision_blocks = create_level()
+        self.level_layer = LevelLayer(self.background, self.platforms, self.walls)
+        self.dirty_rects = []
+        self.full_redraw = True
+        self.bullets = BulletEngine(self.collision_blocks)
 
     def set_winner(self, player):
         self.game_over = True
@@ -134,49 +257,72 @@ class GameClient:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.profiler.toggle()
 
             if not self.game_over:
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                    if self.local_player.try_shoot():
+                    if self.authoritative:
+                        self.fire_pending = True
+                    elif self.local_player.try_shoot():
                         mouse_pos = pygame.mouse.get_pos()
-                        bullet = Bullet(self.local_player.rect.centerx, self.local_player.rect.centery, mouse_pos, self.local_player, self.bullet_projectile, self.set_winner, self.player_id)
-                        self.bullets.add(bullet)
+                        self.bullets.spawn(self.local_player.rect.centerx, self.local_player.rect.centery, mouse_pos, self.player_id)
             else:
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
-                    self.reset_game()
+                    if self.authoritative:
+                        self.reset_pending = True
+                    else:
+                        self.reset_game()
 
     def reset_game(self):
         self.local_player.lives = 3
         self.local_player.respawn()
         self.local_player.rect.topleft = (150, 100)
-        self.bullets.empty()
+        self.local_player.snap()
+        self.bullets.clear()
         self.game_over = False
         self.winner = None
 
+    def step_simulation(self):
+        # One fixed tick, however many frames are drawn around it
+        self.sim_tick += 1
+        self.local_player.previous_pos = self.local_player.rect.topleft
+        was_alive = self.local_player.alive
+        if self.authoritative:
+            self.send_input()
+        else:
+            self.update()
+        if self.local_player.alive and not was_alive:
+            self.local_player.snap()  # respawned inside the simulation step
+        if self.recorder:
+            self.record_tick()
+
     def update(self):
+        if self.authoritative:
+            return
+
         if not self.game_over:
             keys = pygame.key.get_pressed()
 
             # Only update local player if they're alive
             if self.local_player.alive:
-                self.local_player.update(self.platforms.sprites() + self.walls.sprites(), keys)
+                self.local_player.update(self.collision_blocks, keys)
 
-            self.bullets.update()
+            self.bullets.step()
 
             # Check collisions from local bullets to local player (if accidentally shot)
-            for bullet in self.bullets:
-                bullet.check_collision(self.local_player, int(self.player_id),
-                                       self.platforms.sprites() + self.walls.sprites())
-
-            # Check collisions from enemy bullets
-            for b_data in self.enemy_bullets_data:
-                bullet_rect = pygame.Rect(b_data["x"], b_data["y"], 20, 20)
-                if bullet_rect.colliderect(self.local_player.rect) and self.local_player.alive:
-                    self.local_player.lives -= 1
-                    if self.local_player.lives <= 0:
+            self.bullets.collide([(int(self.player_id), self.local_player.sim)])
+
+            # Check collisions from enemy bullets where they are now, the drawn
+            # ones are interpolated INTERP_DELAY in the past
+            enemy_data = self.enemy_snapshots.sample(time.monotonic(), delay=0)
+            enemy_bullets = enemy_data.get("bullets", []) if enemy_data else []
+            if enemy_bullets and self.local_player.alive:
+                xs = np.array([b["x"] for b in enemy_bullets])
+                ys = np.array([b["y"] for b in enemy_bullets])
+                if overlapping(xs, ys, self.local_player.rect).any():
+                    if self.local_player.sim.take_hit():
                         self.set_winner(self.enemy_player)
-                    self.local_player.alive = False
-                    self.local_player.respawn_timer = settings.FPS * 2
 
             # Handle local player respawn
             if not self.local_player.alive:
@@ -191,97 +337,73 @@ class GameClient:
                     self.enemy_player.respawn()
 
 
-    def sync_enemy_bullets(self, bullet_data_list):
-        self.enemy_bullets = pygame.sprite.Group()
-        for bd in bullet_data_list:
-            bullet = Bullet(
-                bd["x"], bd["y"], bd["target"],
-                self.enemy_player,  # enemy is the shooter
-                self.bullet_projectile,
-                self.set_winner
-            )
-            self.enemy_bullets.add(bullet)
-
     def draw(self):
-        self.screen.blit(self.background, (0, 0))
-        self.platforms.draw(self.screen)
-        self.walls.draw(self.screen)
-        self.bullets.draw(self.screen)
-        for b_data in self.enemy_bullets_data:
-            self.screen.blit(self.bullet_projectile, (b_data["x"], b_data["y"]))
-        frame = self.enemy_player.walk_frames[int(self.enemy_frame)]
-        if not self.enemy_player.facing_right:
-            frame = pygame.transform.flip(frame, True, False)
-        self.enemy_player.image = frame
+        # With dirty rects on, only what was drawn last frame is restored from
+        # the level and only changed regions are sent to the display
+        dirty = settings.DIRTY_RECTS and not self.full_redraw
+        if dirty:
+            for rect in self.dirty_rects:
+                self.level_layer.restore(self.screen, rect)
+        else:
+            self.level_layer.draw(self.screen)
+        previous_rects, self.dirty_rects = self.dirty_rects, []
+
+        # The local player and bullets are drawn between their last two ticks
+        alpha = self.timestep.alpha
+        self.dirty_rects += self.screen.blits([(self.bullet_projectile, pos) for pos in self.bullets.positions(alpha)])
+        self.dirty_rects += self.screen.blits([(self.bullet_projectile, (b["x"], b["y"])) for b in self.enemy_bullets_data])
+        self.enemy_player.set_frame(int(self.enemy_frame))
 
 
         if self.local_player.alive:
-            self.screen.blit(self.local_player.image, (self.local_player.rect.x, self.local_player.rect.y))
-            self.draw_gun(self.screen, self.local_player, self.gun_img, True)
-            self.draw_lives(self.local_player)
-            self.draw_ammo(self.local_player)
-            self.draw_dash_icon(self.local_player)
+            rect = self.local_player.rect.copy()
+            rect.topleft = self.local_player.render_pos(alpha)
+            self.blit(self.local_player.image, rect.topleft)
+            self.draw_gun(self.screen, self.local_player, self.gun_rotations, True, rect)
+            self.dirty_rects += self.hud.draw(self.screen, self.local_player, rect)
 
         if self.enemy_player.alive:
-            self.screen.blit(self.enemy_player.image, (self.enemy_player.rect.x, self.enemy_player.rect.y))
-            self.draw_gun(self.screen, self.enemy_player, self.gun_img, False)
-            self.draw_lives(self.enemy_player)
-            self.draw_ammo(self.enemy_player)
-            self.draw_dash_icon(self.enemy_player)
+            self.blit(self.enemy_player.image, (self.enemy_player.rect.x, self.enemy_player.rect.y))
+            self.draw_gun(self.screen, self.enemy_player, self.gun_rotations, False)
+            self.dirty_rects += self.hud.draw(self.screen, self.enemy_player)
         self.draw_cursor()
+        if self.profiler.show_overlay:
+            self.blit(self.profiler.get_overlay(), (10, 10))
 
         if self.game_over:
             self.draw_game_over()
 
-        pygame.display.flip()
+        if dirty:
+            pygame.display.update(previous_rects + self.dirty_rects)
+        else:
+            pygame.display.flip()
+            self.full_redraw = False
+
+    def record_tick(self):
+        # Both players in player id order and every bullet
+        players = [self.local_player.get_data(), self.enemy_player.get_data(self.enemy_player.gun_angle)]
+        if self.player_id == "1":
+            players.reverse()
+        bullets = self.bullets.get_data() + self.enemy_bullets_data
+        self.recorder.record(self.sim_tick, players, bullets, self.winner if self.game_over else None)
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.close()
+            print(f"Match recorded to {self.recorder.path}")
+            self.recorder = None
+
+    def blit(self, image, pos):
+        self.dirty_rects.append(self.screen.blit(image, pos))
 
     def draw_cursor(self):
         x, y = pygame.mouse.get_pos()
-        self.screen.blit(self.cursor_img, (x - self.cursor_img.get_width() // 2, y - self.cursor_img.get_height() // 2))
-
-    def draw_lives(self, player):
-        if not player.alive:
-            return
-        width = self.heart_img.get_width()
-        spacing = 4
-        total = player.lives * (width + spacing) - spacing
-        start_x = player.rect.centerx - total // 2
-        y = player.rect.top - 30
-        for i in range(player.lives):
-            self.screen.blit(self.heart_img, (start_x + i * (width + spacing), y))
-
-    def draw_ammo(self, player):
-        if not player.alive:
-            return
-        spacing = 4
-        width = self.bullet_img.get_width()
-        total = player.max_ammo * (width + spacing) - spacing
-        start_x = player.rect.centerx - total // 2
-        y = player.rect.top - 55
-        for i in range(player.ammo):
-            self.screen.blit(self.bullet_img, (start_x + i * (width + spacing), y))
-        if player.ammo < player.max_ammo:
-            bar_width = 40
-            bar_height = 5
-            fill = int(bar_width * (1 - (player.ammo_timer / player.ammo_cooldown)))
-            bar_x = player.rect.centerx - bar_width // 2
-            bar_y = player.rect.bottom + 10
-            pygame.draw.rect(self.screen, (60, 60, 60), (bar_x, bar_y, bar_width, bar_height))
-            pygame.draw.rect(self.screen, (0, 200, 0), (bar_x, bar_y, fill, bar_height))
-
-    def draw_dash_icon(self, player):
-        icon = self.dash_icon_ready if player.can_dash else self.dash_icon_cooldown
-        x = player.rect.left - icon.get_width() + 5
-        y = player.rect.centery - icon.get_height() // 2
-        self.screen.blit(icon, (x, y))
+        self.blit(self.cursor_img, (x - self.cursor_img.get_width() // 2, y - self.cursor_img.get_height() // 2))
 
     def draw_game_over(self):
-        font = pygame.font.SysFont("arial", 50)
-        small_font = pygame.font.SysFont("arial", 30)
-
-        win_text = font.render(f"{self.winner} Wins!", True, (255, 0, 0))
+        win_text = hud.render_text(f"{self.winner} Wins!", 50, (255, 0, 0))
         win_rect = win_text.get_rect(center=(settings.SCREEN_WIDTH // 2, settings.SCREEN_HEIGHT // 2 - 100))
-        self.screen.blit(win_text, win_rect)
+        self.blit(win_text, win_rect)
 
         # Button dimensions
         button_width, button_height = 200, 50
@@ -291,10 +413,10 @@ class GameClient:
         # Quit Button
         quit_rect = pygame.Rect(center_x - button_width // 2, settings.SCREEN_HEIGHT // 2 + button_height + spacing,
                                 button_width, button_height)
-        pygame.draw.rect(self.screen, (200, 0, 0), quit_rect)
-        quit_text = small_font.render("Quit", True, (0, 0, 0))
+        self.dirty_rects.append(pygame.draw.rect(self.screen, (200, 0, 0), quit_rect))
+        quit_text = hud.render_text("Quit", 30, (0, 0, 0))
         quit_text_rect = quit_text.get_rect(center=quit_rect.center)
-        self.screen.blit(quit_text, quit_text_rect)
+        self.blit(quit_text, quit_text_rect)
 
         # Handle clicks
         mouse_pos = pygame.mouse.get_pos()
@@ -303,35 +425,63 @@ class GameClient:
         if click:
             if quit_rect.collidepoint(mouse_pos):
                 pygame.time.delay(200)
-                self.pro.send_data("quit".encode())  # Notify server
+                self.network.send(codec.encode_quit())  # Notify server
+                self.network.close()
+                self.profiler.dump()
+                self.stop_recording()
                 pygame.quit()
                 exit()
 
-    def draw_gun(self, surface, player, image, is_local):
+    def draw_gun(self, surface, player, rotations, is_local, rect=None):
         if not player.alive:
             return
 
-        player_center = player.rect.center
+        player_center = (rect or player.rect).center
         angle = player.get_gun_angle() if is_local else player.gun_angle
 
-        rotated_gun = pygame.transform.rotate(image, angle)
-
         offset_x = 20 if player.facing_right else -20
         offset_y = 15
         gun_pos = (player_center[0] + offset_x, player_center[1] + offset_y)
 
-        gun_rect = rotated_gun.get_rect(center=gun_pos)
-        surface.blit(rotated_gun, gun_rect.topleft)
+        self.dirty_rects.append(rotations.blit(surface, angle, gun_pos))
 
     def run(self):
         self.connect_to_server()
         while self.running:
-            self.clock.tick(settings.FPS)
+            if self.profiler.enabled:
+                self.run_profiled_frame()
+                continue
+            elapsed = self.clock.tick(settings.FPS) / 1000
             self.handle_events()
             self.send_and_receive_data()
-            self.update()
+            for _ in range(self.timestep.advance(elapsed)):
+                self.step_simulation()
             self.draw()
+        if self.network:
+            self.network.stop()
+        self.profiler.dump()
+        self.stop_recording()
         pygame.quit()
 
+    def run_profiled_frame(self):
+        # Same frame as run(), with each phase timed. "idle" is the time
+        # clock.tick waited, it shrinks to zero when frames overrun.
+        t0 = time.perf_counter()
+        elapsed = self.clock.tick(settings.FPS) / 1000
+        t1 = time.perf_counter()
+        self.handle_events()
+        t2 = time.perf_counter()
+        self.send_and_receive_data()
+        t3 = time.perf_counter()
+        for _ in range(self.timestep.advance(elapsed)):
+            self.step_simulation()
+        t4 = time.perf_counter()
+        self.draw()
+        t5 = time.perf_counter()
+        network = self.network
+        self.profiler.record((t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4),
+                             network.rtt if network else None,
+                             (network.bytes_received, network.bytes_sent) if network else (0, 0))
+
 if __name__ == '__main__':
     GameClient().run()
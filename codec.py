@@ -0,0 +1,449 @@
+# codec.py
+import struct
+
+# Binary snapshot format shared by the client and the server.
+# Every message starts with a version byte and a message type byte.
+VERSION = 4
+
+MSG_STATE = 1
+MSG_EMPTY = 2
+MSG_QUIT = 3
+MSG_INPUT = 4
+MSG_WORLD = 5
+MSG_WORLD_DELTA = 6
+MSG_HELLO = 7
+MSG_INPUT_BUNDLE = 8
+
+FLAG_FACING_RIGHT = 1
+FLAG_ALIVE = 2
+FLAG_CAN_DASH = 4
+FLAG_GAME_OVER = 8
+FLAG_ON_GROUND = 16
+FLAG_JUMP_HELD = 32
+
+# Buttons of an input command
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_JUMP = 4
+INPUT_DASH = 8
+INPUT_FIRE = 16
+INPUT_RESET = 32
+
+ANGLE_SCALE = 100  # gun angle is sent in hundredths of a degree
+FRAME_SCALE = 10   # animation index is sent in tenths of a frame
+
+HEADER = struct.Struct("<BB")
+# sender time in ms, x, y, lives, ammo, frame, flags, gun angle, respawn timer, bullet count
+PLAYER = struct.Struct("<IhhBBBBhHB")
+PLAYER_FLAGS_OFFSET = 11
+# id, x, y, target x, target y, source id
+BULLET = struct.Struct("<HhhhhB")
+NAME_LENGTH = struct.Struct("<B")
+# sequence number, buttons, aim angle, last world tick received
+INPUT = struct.Struct("<IBhI")
+# UDP session token handed out over TCP
+HELLO = struct.Struct("<I")
+BUNDLE_COUNT = struct.Struct("<B")
+# tick, last processed input of the receiver, flags, bullet count
+WORLD = struct.Struct("<IIBB")
+# tick, last processed input of the receiver, ticks back to the baseline, flags, bullet count
+WORLD_DELTA = struct.Struct("<IIBBB")
+# bit per changed player field, followed by the changed fields only
+DELTA_MASK = struct.Struct("<H")
+# x, y, vertical speed, lives, ammo, frame, flags, gun angle, respawn timer,
+# dash cooldown, ammo timer, jump count, sub-pixel x, sub-pixel y
+WORLD_PLAYER = struct.Struct("<hhhBBBBhHHHBhh")
+WORLD_PLAYER_FIELDS = WORLD_PLAYER.format.lstrip("<")
+SPEED_SCALE = 100
+SUBPIXEL_SCALE = 10000  # the fractions are within +-0.5 px
+WORLD_HISTORY_SIZE = 64  # ticks a world snapshot can serve as a delta baseline
+
+MAX_BULLETS = 255
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _clamp(value, low, high):
+    return low if value < low else high if value > high else value
+
+
+def encode_header(msg_type):
+    return HEADER.pack(VERSION, msg_type)
+
+
+def encode_empty():
+    return encode_header(MSG_EMPTY)
+
+
+def encode_quit():
+    return encode_header(MSG_QUIT)
+
+
+def message_type(raw):
+    if len(raw) < HEADER.size:
+        raise CodecError("message too short")
+    version, msg_type = HEADER.unpack_from(raw)
+    if version != VERSION:
+        raise CodecError(f"unsupported codec version {version}")
+    return msg_type
+
+
+def encode_state(data):
+    bullets = data.get("bullets", [])[:MAX_BULLETS]
+    winner = data.get("game_over")
+
+    flags = 0
+    if data["facing_right"]:
+        flags |= FLAG_FACING_RIGHT
+    if data["alive"]:
+        flags |= FLAG_ALIVE
+    if data["can_dash"]:
+        flags |= FLAG_CAN_DASH
+    if winner is not None:
+        flags |= FLAG_GAME_OVER
+
+    out = bytearray(HEADER.size + PLAYER.size)
+    HEADER.pack_into(out, 0, VERSION, MSG_STATE)
+    PLAYER.pack_into(
+        out, HEADER.size,
+        int(data.get("time", 0)) & 0xFFFFFFFF,
+        _clamp(int(data["x"]), -32768, 32767),
+        _clamp(int(data["y"]), -32768, 32767),
+        _clamp(data["lives"], 0, 255),
+        _clamp(data["ammo"], 0, 255),
+        _clamp(int(data["image"] * FRAME_SCALE), 0, 255),
+        flags,
+        _clamp(round(data["gun_angle"] * ANGLE_SCALE), -32768, 32767),
+        _clamp(data["respawn_timer"], 0, 65535),
+        len(bullets),
+    )
+
+    out += _pack_bullets(bullets)
+    if winner is not None:
+        out += _pack_winner(winner)
+    return bytes(out)
+
+
+def decode_state(raw):
+    if message_type(raw) != MSG_STATE:
+        raise CodecError("not a state message")
+    try:
+        sent, x, y, lives, ammo, frame, flags, angle, respawn_timer, count = PLAYER.unpack_from(raw, HEADER.size)
+        bullets, offset = _unpack_bullets(raw, HEADER.size + PLAYER.size, count)
+
+        data = {
+            "time": sent,
+            "x": x,
+            "y": y,
+            "lives": lives,
+            "ammo": ammo,
+            "image": frame / FRAME_SCALE,
+            "facing_right": bool(flags & FLAG_FACING_RIGHT),
+            "gun_angle": angle / ANGLE_SCALE,
+            "alive": bool(flags & FLAG_ALIVE),
+            "respawn_timer": respawn_timer,
+            "can_dash": bool(flags & FLAG_CAN_DASH),
+            "bullets": bullets,
+        }
+
+        if flags & FLAG_GAME_OVER:
+            data["game_over"], offset = _unpack_winner(raw, offset)
+    except struct.error as e:
+        raise CodecError(f"malformed state message: {e}") from None
+
+    if offset != len(raw):
+        raise CodecError("trailing bytes in state message")
+    return data
+
+
+def check_state(raw):
+    # Cheap structural validation so the server can relay without decoding
+    if message_type(raw) != MSG_STATE:
+        raise CodecError("not a state message")
+    if len(raw) < HEADER.size + PLAYER.size:
+        raise CodecError("truncated state message")
+    count = raw[HEADER.size + PLAYER.size - 1]
+    flags = raw[HEADER.size + PLAYER_FLAGS_OFFSET]
+    size = HEADER.size + PLAYER.size + BULLET.size * count
+    if flags & FLAG_GAME_OVER:
+        if len(raw) <= size:
+            raise CodecError("truncated winner name")
+        size += NAME_LENGTH.size + raw[size]
+    if size != len(raw):
+        raise CodecError("state message has the wrong length")
+
+
+def encode_input(seq, buttons, angle, world_ack=0):
+    return HEADER.pack(VERSION, MSG_INPUT) + INPUT.pack(
+        seq & 0xFFFFFFFF, buttons, _clamp(round(angle * ANGLE_SCALE), -32768, 32767), world_ack & 0xFFFFFFFF)
+
+
+def decode_input(raw):
+    if message_type(raw) != MSG_INPUT:
+        raise CodecError("not an input message")
+    if len(raw) != HEADER.size + INPUT.size:
+        raise CodecError("input message has the wrong length")
+    seq, buttons, angle, world_ack = INPUT.unpack_from(raw, HEADER.size)
+    return {"seq": seq, "buttons": buttons, "gun_angle": angle / ANGLE_SCALE, "world_ack": world_ack}
+
+
+def encode_hello(token):
+    return HEADER.pack(VERSION, MSG_HELLO) + HELLO.pack(token)
+
+
+def decode_hello(raw):
+    if message_type(raw) != MSG_HELLO or len(raw) != HEADER.size + HELLO.size:
+        raise CodecError("not a hello message")
+    return HELLO.unpack_from(raw, HEADER.size)[0]
+
+
+def encode_input_bundle(commands):
+    # Several recent input commands in one datagram, oldest first, so a lost
+    # datagram is covered by the next one
+    out = bytearray(HEADER.pack(VERSION, MSG_INPUT_BUNDLE))
+    out += BUNDLE_COUNT.pack(len(commands))
+    for seq, buttons, angle, world_ack in commands:
+        out += INPUT.pack(seq & 0xFFFFFFFF, buttons, _clamp(round(angle * ANGLE_SCALE), -32768, 32767),
+                          world_ack & 0xFFFFFFFF)
+    return bytes(out)
+
+
+def decode_input_bundle(raw):
+    if message_type(raw) != MSG_INPUT_BUNDLE:
+        raise CodecError("not an input bundle")
+    if len(raw) < HEADER.size + BUNDLE_COUNT.size:
+        raise CodecError("truncated input bundle")
+    (count,) = BUNDLE_COUNT.unpack_from(raw, HEADER.size)
+    offset = HEADER.size + BUNDLE_COUNT.size
+    if len(raw) != offset + INPUT.size * count:
+        raise CodecError("input bundle has the wrong length")
+    return [{"seq": seq, "buttons": buttons, "gun_angle": angle / ANGLE_SCALE, "world_ack": world_ack}
+            for seq, buttons, angle, world_ack in INPUT.iter_unpack(raw[offset:])]
+
+
+def quantize_world_player(p):
+    # The exact values that go on the wire, deltas are computed on these
+    flags = 0
+    if p["facing_right"]:
+        flags |= FLAG_FACING_RIGHT
+    if p["alive"]:
+        flags |= FLAG_ALIVE
+    if p["can_dash"]:
+        flags |= FLAG_CAN_DASH
+    if p["on_ground"]:
+        flags |= FLAG_ON_GROUND
+    if p["jump_key_held"]:
+        flags |= FLAG_JUMP_HELD
+    return (
+        _clamp(int(p["x"]), -32768, 32767),
+        _clamp(int(p["y"]), -32768, 32767),
+        _clamp(round(p["vy"] * SPEED_SCALE), -32768, 32767),
+        _clamp(p["lives"], 0, 255),
+        _clamp(p["ammo"], 0, 255),
+        _clamp(int(p["image"] * FRAME_SCALE), 0, 255),
+        flags,
+        _clamp(round(p["gun_angle"] * ANGLE_SCALE), -32768, 32767),
+        _clamp(p["respawn_timer"], 0, 65535),
+        _clamp(p["dash_cooldown"], 0, 65535),
+        _clamp(p["ammo_timer"], 0, 65535),
+        _clamp(p["jump_count"], 0, 255),
+        _clamp(round(p["sub_x"] * SUBPIXEL_SCALE), -32768, 32767),
+        _clamp(round(p["sub_y"] * SUBPIXEL_SCALE), -32768, 32767),
+    )
+
+
+def dequantize_world_player(values):
+    (x, y, vy, lives, ammo, frame, flags, angle, respawn_timer,
+     dash_cooldown, ammo_timer, jump_count, sub_x, sub_y) = values
+    return {
+        "x": x,
+        "y": y,
+        "vy": vy / SPEED_SCALE,
+        "lives": lives,
+        "ammo": ammo,
+        "image": frame / FRAME_SCALE,
+        "facing_right": bool(flags & FLAG_FACING_RIGHT),
+        "gun_angle": angle / ANGLE_SCALE,
+        "alive": bool(flags & FLAG_ALIVE),
+        "respawn_timer": respawn_timer,
+        "can_dash": bool(flags & FLAG_CAN_DASH),
+        "on_ground": bool(flags & FLAG_ON_GROUND),
+        "jump_key_held": bool(flags & FLAG_JUMP_HELD),
+        "dash_cooldown": dash_cooldown,
+        "ammo_timer": ammo_timer,
+        "jump_count": jump_count,
+        "sub_x": sub_x / SUBPIXEL_SCALE,
+        "sub_y": sub_y / SUBPIXEL_SCALE,
+    }
+
+
+_delta_structs = {}
+
+
+def _delta_struct(mask):
+    packer = _delta_structs.get(mask)
+    if packer is None:
+        fields = "".join(f for i, f in enumerate(WORLD_PLAYER_FIELDS) if mask & (1 << i))
+        packer = _delta_structs[mask] = struct.Struct("<" + fields)
+    return packer
+
+
+def _pack_bullets(bullets):
+    out = bytearray(BULLET.size * len(bullets))
+    offset = 0
+    for b in bullets:
+        tx, ty = b["target"]
+        BULLET.pack_into(
+            out, offset,
+            b.get("id", 0) & 0xFFFF,
+            _clamp(int(b["x"]), -32768, 32767),
+            _clamp(int(b["y"]), -32768, 32767),
+            _clamp(int(tx), -32768, 32767),
+            _clamp(int(ty), -32768, 32767),
+            b["source_id"],
+        )
+        offset += BULLET.size
+    return out
+
+
+def _unpack_bullets(raw, offset, count):
+    bullets = []
+    for bullet_id, bx, by, tx, ty, source_id in BULLET.iter_unpack(raw[offset:offset + BULLET.size * count]):
+        bullets.append({"id": bullet_id, "x": bx, "y": by, "target": (tx, ty), "source_id": source_id})
+    if len(bullets) != count:
+        raise CodecError("truncated bullet list")
+    return bullets, offset + BULLET.size * count
+
+
+def _pack_winner(winner):
+    name = str(winner).encode()[:255]
+    return NAME_LENGTH.pack(len(name)) + name
+
+
+def _unpack_winner(raw, offset):
+    (length,) = NAME_LENGTH.unpack_from(raw, offset)
+    offset += NAME_LENGTH.size
+    name = bytes(raw[offset:offset + length])
+    if len(name) != length:
+        raise CodecError("truncated winner name")
+    return name.decode(), offset + length
+
+
+def encode_world(tick, ack, players, bullets, winner=None):
+    # players may be data dicts or already quantized tuples
+    bullets = bullets[:MAX_BULLETS]
+    flags = FLAG_GAME_OVER if winner is not None else 0
+
+    out = bytearray(HEADER.size + WORLD.size + WORLD_PLAYER.size * len(players))
+    HEADER.pack_into(out, 0, VERSION, MSG_WORLD)
+    WORLD.pack_into(out, HEADER.size, tick & 0xFFFFFFFF, ack & 0xFFFFFFFF, flags, len(bullets))
+
+    offset = HEADER.size + WORLD.size
+    for p in players:
+        WORLD_PLAYER.pack_into(out, offset, *(p if isinstance(p, tuple) else quantize_world_player(p)))
+        offset += WORLD_PLAYER.size
+
+    out += _pack_bullets(bullets)
+    if winner is not None:
+        out += _pack_winner(winner)
+    return bytes(out)
+
+
+def encode_world_delta(tick, ack, players, baseline_tick, baseline, bullets, winner=None):
+    # players and baseline are quantized tuples, only changed fields are sent.
+    # Bullets move every tick so they always go in full.
+    bullets = bullets[:MAX_BULLETS]
+    flags = FLAG_GAME_OVER if winner is not None else 0
+
+    out = bytearray(HEADER.pack(VERSION, MSG_WORLD_DELTA))
+    age = tick - baseline_tick
+    if not 0 <= age < 256:
+        raise CodecError(f"baseline {baseline_tick} is too old for tick {tick}")
+    out += WORLD_DELTA.pack(tick & 0xFFFFFFFF, ack & 0xFFFFFFFF, age, flags, len(bullets))
+
+    for values, base in zip(players, baseline):
+        mask = 0
+        changed = []
+        for i, (value, old) in enumerate(zip(values, base)):
+            if value != old:
+                mask |= 1 << i
+                changed.append(value)
+        out += DELTA_MASK.pack(mask)
+        if mask:
+            out += _delta_struct(mask).pack(*changed)
+
+    out += _pack_bullets(bullets)
+    if winner is not None:
+        out += _pack_winner(winner)
+    return bytes(out)
+
+
+class WorldDecoder:
+    # Client side of delta compression: remembers recent world snapshots so
+    # deltas can be applied to whichever baseline the server picked
+    def __init__(self, player_count=2, history_size=WORLD_HISTORY_SIZE):
+        self.player_count = player_count
+        self.history_size = history_size
+        self.baselines = {}  # tick -> quantized players
+        self.last_tick = 0
+
+    def decode(self, raw):
+        msg_type = message_type(raw)
+        try:
+            if msg_type == MSG_WORLD:
+                tick, ack, flags, count = WORLD.unpack_from(raw, HEADER.size)
+                offset = HEADER.size + WORLD.size
+                players = []
+                for _ in range(self.player_count):
+                    players.append(WORLD_PLAYER.unpack_from(raw, offset))
+                    offset += WORLD_PLAYER.size
+
+            elif msg_type == MSG_WORLD_DELTA:
+                tick, ack, age, flags, count = WORLD_DELTA.unpack_from(raw, HEADER.size)
+                baseline_tick = tick - age
+                baseline = self.baselines.get(baseline_tick)
+                if baseline is None:
+                    raise CodecError(f"missing baseline {baseline_tick}")
+                offset = HEADER.size + WORLD_DELTA.size
+                players = []
+                for base in baseline:
+                    (mask,) = DELTA_MASK.unpack_from(raw, offset)
+                    offset += DELTA_MASK.size
+                    values = list(base)
+                    if mask:
+                        packer = _delta_struct(mask)
+                        changed = iter(packer.unpack_from(raw, offset))
+                        offset += packer.size
+                        for i in range(len(values)):
+                            if mask & (1 << i):
+                                values[i] = next(changed)
+                    players.append(tuple(values))
+
+            else:
+                raise CodecError("not a world message")
+
+            bullets, offset = _unpack_bullets(raw, offset, count)
+            world = {"tick": tick, "ack": ack,
+                     "players": [dequantize_world_player(p) for p in players], "bullets": bullets}
+            if flags & FLAG_GAME_OVER:
+                world["game_over"], offset = _unpack_winner(raw, offset)
+        except struct.error as e:
+            raise CodecError(f"malformed world message: {e}") from None
+
+        if offset != len(raw):
+            raise CodecError("trailing bytes in world message")
+
+        self.baselines[tick] = tuple(players)
+        self.last_tick = max(self.last_tick, tick)
+        if len(self.baselines) > self.history_size:
+            oldest = self.last_tick - self.history_size
+            for old_tick in [t for t in self.baselines if t <= oldest]:
+                del self.baselines[old_tick]
+        return world
+
+
+def decode_world(raw, player_count=2):
+    # Full snapshots only, deltas need a WorldDecoder
+    return WorldDecoder(player_count).decode(raw)
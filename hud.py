@@ -0,0 +1,90 @@
+# hud.py
+# Fonts, rendered text and the per-player lives/ammo/dash widgets, built once
+# and reused. A player's whole HUD goes out in a single Surface.blits call.
+import pygame
+
+ICON_SPACING = 4
+AMMO_BAR_SIZE = (40, 5)
+AMMO_BAR_BACK = (60, 60, 60)
+AMMO_BAR_FILL = (0, 200, 0)
+
+_fonts = {}
+_texts = {}
+
+
+def get_font(name, size):
+    # SysFont searches the system fonts on every call
+    font = _fonts.get((name, size))
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = _fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return font
+
+
+def render_text(text, size, color, font_name="arial"):
+    key = (text, size, color, font_name)
+    surface = _texts.get(key)
+    if surface is None:
+        surface = _texts[key] = get_font(font_name, size).render(text, True, color)
+    return surface
+
+
+def make_strip(icon, count, spacing=ICON_SPACING):
+    # count copies of icon side by side, pixel-identical to blitting them one by one
+    width, height = icon.get_size()
+    strip = pygame.Surface((max(count * (width + spacing) - spacing, 0), height), pygame.SRCALPHA)
+    for i in range(count):
+        strip.blit(icon, (i * (width + spacing), 0), special_flags=pygame.BLEND_RGBA_MAX)
+    return strip
+
+
+class Hud:
+    def __init__(self, heart_img, bullet_img, dash_ready, dash_cooldown):
+        self.heart_img = heart_img
+        self.bullet_img = bullet_img
+        self.dash_ready = dash_ready
+        self.dash_cooldown = dash_cooldown
+        self.lives_strips = {}  # count -> surface
+        self.ammo_strips = {}
+        self.ammo_bars = {}     # filled width -> surface
+
+    def strip(self, strips, icon, count):
+        surface = strips.get(count)
+        if surface is None:
+            surface = strips[count] = make_strip(icon, count)
+        return surface
+
+    def ammo_bar(self, fill):
+        bar = self.ammo_bars.get(fill)
+        if bar is None:
+            bar = self.ammo_bars[fill] = pygame.Surface(AMMO_BAR_SIZE)
+            bar.fill(AMMO_BAR_BACK)
+            bar.fill(AMMO_BAR_FILL, (0, 0, fill, AMMO_BAR_SIZE[1]))
+        return bar
+
+    def player_items(self, player, rect=None):
+        # (surface, position) pairs for lives, ammo and the dash icon, around
+        # rect when the player is drawn somewhere other than player.rect
+        rect = rect or player.rect
+        items = []
+        if player.alive:
+            if player.lives > 0:
+                lives = self.strip(self.lives_strips, self.heart_img, player.lives)
+                items.append((lives, (rect.centerx - lives.get_width() // 2, rect.top - 30)))
+
+            width = self.bullet_img.get_width()
+            total = player.max_ammo * (width + ICON_SPACING) - ICON_SPACING
+            if player.ammo > 0:
+                ammo = self.strip(self.ammo_strips, self.bullet_img, player.ammo)
+                items.append((ammo, (rect.centerx - total // 2, rect.top - 55)))
+            if player.ammo < player.max_ammo:
+                fill = int(AMMO_BAR_SIZE[0] * (1 - (player.ammo_timer / player.ammo_cooldown)))
+                items.append((self.ammo_bar(fill), (rect.centerx - AMMO_BAR_SIZE[0] // 2, rect.bottom + 10)))
+
+        icon = self.dash_ready if player.can_dash else self.dash_cooldown
+        items.append((icon, (rect.left - icon.get_width() + 5, rect.centery - icon.get_height() // 2)))
+        return items
+
+    def draw(self, surface, player, rect=None):
+        return surface.blits(self.player_items(player, rect))
@@ -0,0 +1,110 @@
+# interpolation.py
+from collections import deque
+
+import settings
+
+# Lets the estimated sender clock drift upwards again after a late packet
+OFFSET_RELAX = 0.0005
+
+
+def lerp(a, b, t):
+    return a + (b - a) * t
+
+
+def lerp_position(a, b, t):
+    # Whole pixels between two (x, y) positions
+    return round(lerp(a[0], b[0], t)), round(lerp(a[1], b[1], t))
+
+
+def lerp_angle(a, b, t):
+    # Shortest way around, gun angles are in degrees
+    diff = (b - a + 180) % 360 - 180
+    return a + diff * t
+
+
+def lerp_bullets(older, newer, t):
+    # Bullets are matched by owner and id, new ones show up once their
+    # snapshot is reached and dead ones disappear with the older snapshot
+    by_key = {(b["source_id"], b["id"]): b for b in older}
+    bullets = []
+    for b in newer:
+        a = by_key.get((b["source_id"], b["id"]))
+        if a is None:
+            if t >= 1:
+                bullets.append(b)
+            continue
+        bullet = dict(b)
+        bullet["x"] = lerp(a["x"], b["x"], t)
+        bullet["y"] = lerp(a["y"], b["y"], t)
+        bullets.append(bullet)
+    return bullets
+
+
+def lerp_player(older, newer, t):
+    # Discrete fields (lives, alive, frame...) switch when the newer snapshot is reached
+    data = dict(newer if t >= 1 else older)
+    data["x"] = lerp(older["x"], newer["x"], t)
+    data["y"] = lerp(older["y"], newer["y"], t)
+    data["gun_angle"] = lerp_angle(older["gun_angle"], newer["gun_angle"], t)
+    if "bullets" in newer:
+        data["bullets"] = lerp_bullets(older.get("bullets", []), newer["bullets"], t)
+    return data
+
+
+class SnapshotBuffer:
+    # Ring buffer of timestamped remote snapshots, sampled a fixed delay in the
+    # past so uneven packet arrival doesn't show up as jerky motion
+    def __init__(self, size=settings.SNAPSHOT_BUFFER_SIZE, delay=settings.INTERP_DELAY,
+                 max_extrapolation=settings.MAX_EXTRAPOLATION):
+        self.snapshots = deque(maxlen=size)  # (sender time, data)
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.clock_offset = None  # local time minus sender time
+
+    def clear(self):
+        self.snapshots.clear()
+        self.clock_offset = None
+
+    def add(self, sender_time, data, now):
+        if self.snapshots and sender_time < self.snapshots[-1][0] - 1:
+            self.clear()  # the sender restarted its clock
+        if self.snapshots and sender_time <= self.snapshots[-1][0]:
+            return  # duplicate or out of order
+        self.snapshots.append((sender_time, data))
+
+        # The smallest offset seen belongs to the least delayed packet
+        offset = now - sender_time
+        if self.clock_offset is None or offset < self.clock_offset + OFFSET_RELAX:
+            self.clock_offset = offset
+        else:
+            self.clock_offset += OFFSET_RELAX
+
+    def sample(self, now, delay=None):
+        # delay=0 estimates where the sender is now, extrapolating from the
+        # newest snapshots, for decisions that can't be made in the past
+        if not self.snapshots:
+            return None
+        if len(self.snapshots) == 1:
+            return self.snapshots[0][1]
+
+        render_time = now - self.clock_offset - (self.delay if delay is None else delay)
+
+        oldest_time, oldest = self.snapshots[0]
+        if render_time <= oldest_time:
+            return oldest
+
+        newest_time = self.snapshots[-1][0]
+        if render_time >= newest_time:
+            # Late packets: keep moving along the last known velocity for a while
+            older_time, older = self.snapshots[-2]
+            render_time = min(render_time, newest_time + self.max_extrapolation)
+            t = (render_time - older_time) / (newest_time - older_time)
+            return lerp_player(older, self.snapshots[-1][1], t)
+
+        for i in range(len(self.snapshots) - 1, 0, -1):
+            older_time, older = self.snapshots[i - 1]
+            if older_time <= render_time:
+                newer_time, newer = self.snapshots[i]
+                t = (render_time - older_time) / (newer_time - older_time)
+                return lerp_player(older, newer, t)
+        return oldest
@@ -1,68 +1,59 @@
 # level.py
 import pygame
-from settings import SCREEN_WIDTH, SCREEN_HEIGHT
+import asset_manager
+from simulation import LEVEL_PLATFORMS, LEVEL_WALLS, level_blocks
 
 class Platform(pygame.sprite.Sprite):
     def __init__(self, x, y, width, height):
         super().__init__()
-        self.image = pygame.image.load("assets/platform.png").convert_alpha()
-        self.image = pygame.transform.scale(self.image, (width, height))
+        self.image = asset_manager.load("assets/platform.png", (width, height))
         self.rect = self.image.get_rect(topleft=(x, y))
 
 class Wall(pygame.sprite.Sprite):
     def __init__(self, x, y, width, height):
         super().__init__()
-        self.image = pygame.image.load("assets/wall.png").convert_alpha()
-        self.image = pygame.transform.scale(self.image, (width, height))
+        self.image = asset_manager.load("assets/wall.png", (width, height))
         self.rect = self.image.get_rect(topleft=(x, y))
 
 
 
+class LevelLayer:
+    # Background, platforms and walls baked into one opaque surface, so a
+    # frame starts with a single blit and dirty regions restore from it
+    def __init__(self, background, platforms, walls):
+        self.background = background
+        self.platforms = platforms
+        self.walls = walls
+        self.surface = None
 
-def create_level():
-    platforms = pygame.sprite.Group()
-    walls = pygame.sprite.Group()
+    def invalidate(self):
+        # Call after changing the level, the next draw bakes it again
+        self.surface = None
 
-    # --- Platforms (horizontal) ---
-    platform_data = [
-        (0, 680, 1280, 40),
-        (80, 600, 180, 20),
-        (1020, 600, 180, 20),
-        (570, 460, 120, 20),
-        (570, 340, 120, 20),
-        (570, 220, 120, 20),
-        (250, 480, 100, 20),
-        (930, 480, 100, 20),
-        (370, 360, 100, 20),
-        (810, 360, 100, 20),
-        (150, 240, 100, 20),
-        (1030, 240, 100, 20),
-        (590, 60, 100, 20),
-    ]
+    def get_surface(self):
+        if self.surface is None:
+            self.surface = self.background.copy()
+            self.platforms.draw(self.surface)
+            self.walls.draw(self.surface)
+        return self.surface
 
-    for x, y, w, h in platform_data:
-        platforms.add(Platform(x, y, w, h))
+    def draw(self, surface):
+        surface.blit(self.get_surface(), (0, 0))
 
-    # --- Walls (vertical) ---
-    wall_data = [
-        # Middle towers
-        (480, 400, 40, 120),
-        (760, 400, 40, 120),
-        (480, 280, 40, 120),
-        (760, 280, 40, 120),
-        (480, 160, 40, 120),
-        (760, 160, 40, 120),
+    def restore(self, surface, rect):
+        surface.blit(self.get_surface(), rect, rect)
 
-        # Map boundary walls (left/right)
-        (0, 0, 20, SCREEN_HEIGHT),  # Left wall
-        (SCREEN_WIDTH - 20, 0, 20, SCREEN_HEIGHT),  # Right wall
 
-        #extra visual floor edge walls
-        (0, SCREEN_HEIGHT - 60, 40, 60),
-        (SCREEN_WIDTH - 40, SCREEN_HEIGHT - 60, 40, 60),
-    ]
+def create_level():
+    platforms = pygame.sprite.Group()
+    walls = pygame.sprite.Group()
+
+    # Layout is shared with the headless simulation
+    for x, y, w, h in LEVEL_PLATFORMS:
+        platforms.add(Platform(x, y, w, h))
 
-    for x, y, w, h in wall_data:
+    for x, y, w, h in LEVEL_WALLS:
         walls.add(Wall(x, y, w, h))
 
-    return platforms, walls
\ No newline at end of file
+    # Collision goes through a grid index over the same rects
+    return platforms, walls, level_blocks()
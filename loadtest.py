@@ -0,0 +1,419 @@
+# loadtest.py
+# Headless bots that connect to a running server over the real protocol and
+# play until the time is up, to find how many matches one server process can
+# sustain and to catch regressions before a deploy. Start the server first:
+#   python server.py --authoritative --metrics-port 9100
+#   python loadtest.py --matches 50 --duration 30 --max-p99 50
+# The mode (relay, authoritative or UDP) follows the server's start signal.
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import random
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+import codec
+import protocol
+import settings
+from bullet_engine import BulletEngine
+from match import SPAWN_POINTS, AIM_DISTANCE, step_player
+from simulation import SimPlayer, level_blocks
+
+QUIT_GRACE = 1.0  # the opponent quitting this close to the end is just the other bot finishing
+
+# How often a bot presses things, per second
+JUMPS_PER_SECOND = 1.0
+DASHES_PER_SECOND = 0.2
+SHOTS_PER_SECOND = 2.0
+
+
+class Stats:
+    # Counts and latency samples of the bots in one process, merged at the end
+    def __init__(self):
+        self.counts = Counter()  # messages and bytes, only while measuring
+        self.errors = Counter()
+        self.latencies = {"rtt": [], "handshake": []}  # seconds
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.errors.update(other.errors)
+        for name, values in other.latencies.items():
+            self.latencies[name].extend(values)
+
+    def summary(self, bots, duration):
+        report = {
+            "bots": bots,
+            "matches": self.counts["started"] // 2,
+            "duration": duration,
+            "messages_out_per_s": self.counts["messages_out"] / duration,
+            "messages_in_per_s": self.counts["messages_in"] / duration,
+            "bytes_out_per_s": self.counts["bytes_out"] / duration,
+            "bytes_in_per_s": self.counts["bytes_in"] / duration,
+            "late_sends": self.counts["late_sends"],
+            "errors": dict(self.errors),
+            "desyncs": self.errors["desync"],
+        }
+        for name, values in self.latencies.items():
+            ms = np.array(values) * 1000
+            if len(ms):
+                report[f"{name}_ms"] = {
+                    "count": len(ms),
+                    "mean": float(ms.mean()),
+                    "p50": float(np.percentile(ms, 50)),
+                    "p90": float(np.percentile(ms, 90)),
+                    "p99": float(np.percentile(ms, 99)),
+                    "max": float(ms.max()),
+                }
+        return report
+
+
+class BotDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, bot):
+        self.bot = bot
+
+    def datagram_received(self, data, addr):
+        self.bot.handle_datagram(data)
+
+    def error_received(self, exc):
+        self.bot.stats.errors["udp"] += 1
+
+
+class Bot:
+    # One headless client. Relay bots run their own player and bullets and
+    # send snapshots, authoritative bots only send inputs. Latency is the time
+    # from sending a message to the server's reply to it.
+    def __init__(self, bot_id, args, stats, measure_from, stop_at):
+        self.bot_id = bot_id
+        self.args = args
+        self.stats = stats
+        self.measure_from = measure_from
+        self.stop_at = stop_at
+        self.rng = random.Random(args.seed * 1000003 + bot_id)
+        self.rate = args.rate
+        self.writer = None
+        self.finished = False
+
+        self.movement = 0
+        self.hold_until = 0.0
+        self.gun_angle = 0.0
+
+        # Relay
+        self.sent_times = deque()  # send time of every state still waiting for its reply
+        self.last_enemy_time = -1
+
+        # Authoritative
+        self.seq = 0
+        self.input_times = deque()  # (seq, send time) waiting for the server's ack
+        self.world_decoder = codec.WorldDecoder()
+        self.last_tick = -1
+        self.last_ack = 0
+        self.recent_inputs = deque(maxlen=settings.INPUT_REDUNDANCY)
+        self.transport = None
+        self.udp_ready = False
+
+    def measuring(self, now):
+        return self.measure_from <= now < self.stop_at
+
+    def count_message(self, direction, data, now):
+        if self.measuring(now):
+            self.stats.counts[f"messages_{direction}"] += 1
+            self.stats.counts[f"bytes_{direction}"] += len(data)
+
+    def observe(self, name, value, now):
+        if self.measuring(now):
+            self.stats.latencies[name].append(value)
+
+    def next_buttons(self, now):
+        # Hold a direction for a while like a person would, press the rest now and then
+        if now >= self.hold_until:
+            self.movement = self.rng.choice((0, codec.INPUT_LEFT, codec.INPUT_RIGHT))
+            self.hold_until = now + self.rng.uniform(0.2, 1.5)
+        buttons = self.movement
+        if self.rng.random() < JUMPS_PER_SECOND / self.steps_per_second:
+            buttons |= codec.INPUT_JUMP
+        if self.rng.random() < DASHES_PER_SECOND / self.steps_per_second:
+            buttons |= codec.INPUT_DASH
+        if self.rng.random() < SHOTS_PER_SECOND / self.steps_per_second:
+            buttons |= codec.INPUT_FIRE
+        self.gun_angle = (self.gun_angle + self.rng.uniform(-15, 15) + 180) % 360 - 180
+        return buttons
+
+    def write(self, data, now):
+        protocol.write_frame(self.writer, data)
+        self.count_message("out", data, now)
+
+    async def run(self):
+        launch = self.measure_from - self.args.ramp
+        await asyncio.sleep(max(0, launch + self.bot_id * self.args.ramp / self.args.bots - time.monotonic()))
+        connected_at = time.monotonic()
+        try:
+            reader, self.writer = await asyncio.open_connection(self.args.host, self.args.port)
+        except OSError:
+            self.stats.errors["connect"] += 1
+            return
+
+        try:
+            try:
+                player_id = await asyncio.wait_for(protocol.read_frame(reader), self.stop_at - connected_at)
+                start_signal = await asyncio.wait_for(protocol.read_frame(reader), self.stop_at - time.monotonic())
+            except asyncio.TimeoutError:
+                self.stats.errors["no_opponent"] += 1
+                return
+            words = start_signal.decode().split() if start_signal else []
+            if not player_id or not words or words[0] != "start":
+                self.stats.errors["handshake"] += 1
+                return
+            self.player_id = int(player_id)
+            self.stats.counts["started"] += 1
+            self.stats.latencies["handshake"].append(time.monotonic() - connected_at)
+
+            if "udp" in words[1:]:
+                await self.play(reader, self.send_input_datagram, int(words[-1]))
+            elif "auth" in words[1:]:
+                await self.play(reader, self.send_input)
+            else:
+                await self.play(reader, self.send_state)
+        except (ConnectionError, OSError):
+            self.stats.errors["disconnect"] += 1
+        finally:
+            self.writer.close()
+
+    async def play(self, reader, send, token=None):
+        authoritative = send != self.send_state
+        if self.rate is None:
+            self.rate = settings.TICK_RATE if authoritative else settings.NET_SEND_RATE
+        if authoritative:
+            self.steps = 1
+        else:
+            # Relay clients simulate every tick but send at NET_SEND_RATE
+            self.steps = max(1, round(settings.TICK_RATE / self.rate))
+            self.sim = SimPlayer(*SPAWN_POINTS[self.player_id])
+            self.blocks = level_blocks()
+            self.bullets = BulletEngine(self.blocks)
+            self.started = time.monotonic()
+        self.steps_per_second = self.rate * self.steps  # next_buttons runs once per step
+
+        if token is not None:
+            loop = asyncio.get_running_loop()
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: BotDatagramProtocol(self), remote_addr=(self.args.host, self.args.port))
+            self.token = token
+            self.transport.sendto(codec.encode_hello(token))
+
+        receiver = asyncio.ensure_future(self.receive_loop(reader))
+        try:
+            interval = 1 / self.rate
+            next_send = time.monotonic()
+            while not self.finished:
+                now = time.monotonic()
+                if now >= self.stop_at:
+                    break
+                if now - next_send > interval and self.measuring(now):
+                    self.stats.counts["late_sends"] += 1  # the bots themselves cannot keep up
+                send(now)
+                await self.writer.drain()
+                next_send = max(next_send + interval, now - interval)
+                await asyncio.sleep(max(0, next_send - time.monotonic()))
+
+            if not self.finished:
+                self.write(codec.encode_quit(), time.monotonic())
+                await self.writer.drain()
+            await asyncio.wait_for(receiver, QUIT_GRACE)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            receiver.cancel()
+            if self.transport:
+                self.transport.close()
+
+    def send_state(self, now):
+        for _ in range(self.steps):
+            buttons = self.next_buttons(now)
+            self.sim.gun_angle = self.gun_angle
+            if step_player(self.sim, self.blocks, buttons):
+                angle = math.radians(self.gun_angle)
+                x, y = self.sim.rect.center
+                target = (x + math.cos(angle) * AIM_DISTANCE, y - math.sin(angle) * AIM_DISTANCE)
+                self.bullets.spawn(x, y, target, self.player_id)
+            self.bullets.step()
+            self.bullets.collide([])
+        data = self.sim.get_data()
+        data["bullets"] = self.bullets.get_data()
+        data["time"] = int((now - self.started) * 1000)
+        self.write(codec.encode_state(data), now)
+        self.sent_times.append(now)
+
+    def next_input(self, now):
+        self.seq += 1
+        self.input_times.append((self.seq, now))
+        return self.seq, self.next_buttons(now), self.gun_angle, self.world_decoder.last_tick
+
+    def send_input(self, now):
+        self.write(codec.encode_input(*self.next_input(now)), now)
+
+    def send_input_datagram(self, now):
+        if not self.udp_ready:
+            self.transport.sendto(codec.encode_hello(self.token))
+        self.recent_inputs.append(self.next_input(now))
+        data = codec.encode_input_bundle(self.recent_inputs)
+        self.transport.sendto(data)
+        self.count_message("out", data, now)
+
+    async def receive_loop(self, reader):
+        while True:
+            raw_data = await protocol.read_frame(reader)
+            now = time.monotonic()
+            if not raw_data:
+                if not self.finished and now < self.stop_at - QUIT_GRACE:
+                    self.stats.errors["disconnect"] += 1
+                return
+            self.count_message("in", raw_data, now)
+            try:
+                self.handle_message(raw_data, now)
+            except codec.CodecError:
+                self.stats.errors["decode"] += 1
+            if self.finished:
+                return
+
+    def handle_message(self, raw_data, now):
+        msg_type = codec.message_type(raw_data)
+        if msg_type == codec.MSG_QUIT:
+            self.finished = True
+            if now < self.stop_at - QUIT_GRACE:
+                self.stats.errors["opponent_quit"] += 1
+            return
+
+        if msg_type in (codec.MSG_WORLD, codec.MSG_WORLD_DELTA):
+            self.handle_world(raw_data, now, stream=True)
+            return
+
+        # Relay: the server answers every state with the opponent's latest one
+        if self.sent_times:
+            self.observe("rtt", now - self.sent_times.popleft(), now)
+        if msg_type == codec.MSG_STATE:
+            enemy_time = codec.decode_state(raw_data)["time"]
+            if enemy_time < self.last_enemy_time:
+                self.stats.errors["desync"] += 1  # opponent's snapshots went back in time
+            self.last_enemy_time = enemy_time
+
+    def handle_datagram(self, raw_data):
+        now = time.monotonic()
+        self.udp_ready = True
+        self.count_message("in", raw_data, now)
+        try:
+            self.handle_world(raw_data, now, stream=False)
+        except codec.CodecError:
+            self.stats.errors["decode"] += 1
+
+    def handle_world(self, raw_data, now, stream):
+        try:
+            world = self.world_decoder.decode(raw_data)
+        except codec.CodecError:
+            self.stats.errors["desync"] += 1  # e.g. a delta against a baseline we never had
+            return
+
+        tick, ack = world["tick"], world["ack"]
+        if tick < self.last_tick or (tick == self.last_tick and not stream):
+            if stream:
+                self.stats.errors["desync"] += 1  # TCP never reorders
+            else:
+                self.stats.counts["stale_datagrams"] += 1
+            return
+        if ack < self.last_ack or ack > self.seq:
+            self.stats.errors["desync"] += 1  # acked an input we never sent, or forgot one
+        self.last_tick, self.last_ack = tick, max(self.last_ack, ack)
+
+        sent_at = None
+        while self.input_times and self.input_times[0][0] <= ack:
+            seq, sent_at = self.input_times.popleft()
+        if sent_at is not None and seq == ack:
+            self.observe("rtt", now - sent_at, now)
+
+
+async def run_bots(bot_ids, args, measure_from, stop_at):
+    stats = Stats()
+    await asyncio.gather(*(Bot(bot_id, args, stats, measure_from, stop_at).run() for bot_id in bot_ids))
+    return stats
+
+
+def run_worker(bot_ids, args, measure_from, stop_at):
+    return asyncio.run(run_bots(bot_ids, args, measure_from, stop_at))
+
+
+def run(args):
+    # Bots are spread over the worker processes round-robin, their connects
+    # over the ramp so the server pairs them up in order
+    measure_from = time.monotonic() + args.ramp
+    stop_at = measure_from + args.duration
+    groups = [(range(i, args.bots, args.processes), args, measure_from, stop_at) for i in range(args.processes)]
+    if args.processes == 1:
+        results = [run_worker(*groups[0])]
+    else:
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.starmap(run_worker, groups)
+
+    stats = Stats()
+    for result in results:
+        stats.merge(result)
+    return stats.summary(args.bots, args.duration)
+
+
+def print_report(report):
+    print(f"{report['matches']} matches ({report['bots']} bots) for {report['duration']:.0f} s")
+    print(f"out {report['messages_out_per_s']:.0f} msg/s {report['bytes_out_per_s'] / 1024:.1f} KiB/s, "
+          f"in {report['messages_in_per_s']:.0f} msg/s {report['bytes_in_per_s'] / 1024:.1f} KiB/s")
+    for name in ("rtt", "handshake"):
+        stat = report.get(f"{name}_ms")
+        if stat:
+            print(f"{name:9} ms  p50 {stat['p50']:7.2f}  p90 {stat['p90']:7.2f}  p99 {stat['p99']:7.2f}  "
+                  f"max {stat['max']:7.2f}  ({stat['count']} samples)")
+    errors = ", ".join(f"{name} {count}" for name, count in sorted(report["errors"].items())) or "none"
+    print(f"errors: {errors}, late sends: {report['late_sends']}")
+
+
+def check(report, args):
+    # Returns the failed limits, for gating a deploy on the exit code
+    failures = []
+    rtt = report.get("rtt_ms")
+    if rtt is None:
+        failures.append("no round-trips measured")
+    elif args.max_p99 is not None and rtt["p99"] > args.max_p99:
+        failures.append(f"rtt p99 {rtt['p99']:.2f} ms > {args.max_p99} ms")
+    errors = sum(report["errors"].values())
+    if args.max_errors is not None and errors > args.max_errors:
+        failures.append(f"{errors} errors > {args.max_errors}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--matches", type=int, default=10, help="concurrent matches, two bots each")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="messages per second per bot (default: NET_SEND_RATE for relay, TICK_RATE otherwise)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds measured after the ramp")
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds over which the bots connect")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes running the bots")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--max-p99", type=float, default=None, help="fail if the rtt p99 exceeds this many ms")
+    parser.add_argument("--max-errors", type=int, default=None, help="fail on more errors than this")
+    args = parser.parse_args()
+    args.bots = args.matches * 2
+    args.processes = max(1, min(args.processes, args.bots))
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = check(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    raise SystemExit(1 if failures else 0)
@@ -1,9 +1,12 @@
 # main.py
 import pygame
 from settings import *
-from level import create_level
+import asset_manager
+import hud
+from level import create_level, LevelLayer
 from player import Player
-from bullet import Bullet
+from bullet_engine import BulletEngine
+from timestep import FixedTimestep
 import math
 
 pygame.init()
@@ -12,31 +15,23 @@ pygame.mouse.set_visible(False)
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Platform Duel")
 
-heart_img = pygame.image.load("assets/heart.png").convert_alpha()
-heart_img = pygame.transform.scale(heart_img, (20, 20))  # Resize if needed
+heart_img = asset_manager.load("assets/heart.png", (20, 20))  # Resize if needed
+bullet_img = asset_manager.load("assets/bullet_icon.png", (20, 20))
+bullet_projectile = asset_manager.load("assets/bullet_projectile.png", (20, 20))
+background = asset_manager.load("assets/jungle_bg.png", (SCREEN_WIDTH, SCREEN_HEIGHT), 0)
+cursor_img = asset_manager.load("assets/cursor.png", (48, 48))  # or (48, 48)
+gun_img = asset_manager.load("assets/gun.png", (70, 28))
+gun_rotations = asset_manager.RotationCache(gun_img)
 
-bullet_img = pygame.image.load("assets/bullet_icon.png").convert_alpha()
-bullet_img = pygame.transform.scale(bullet_img, (20, 20))
-
-bullet_projectile = pygame.image.load("assets/bullet_projectile.png").convert_alpha()
-bullet_projectile = pygame.transform.scale(bullet_projectile, (20, 20))
-
-background = pygame.image.load("assets/jungle_bg.png").convert()
-background = pygame.transform.scale(background, (SCREEN_WIDTH, SCREEN_HEIGHT))
-
-cursor_img = pygame.image.load("assets/cursor.png").convert_alpha()
-cursor_img = pygame.transform.scale(cursor_img, (48, 48))  # or (48, 48)
-
-gun_img = pygame.image.load("assets/gun.png").convert_alpha()
-gun_img = pygame.transform.scale(gun_img, (70, 28))
-
-dash_icon_ready = pygame.transform.scale(pygame.image.load("assets/dash_ready.png").convert_alpha(), (40, 40))
-dash_icon_cooldown = pygame.transform.scale(pygame.image.load("assets/dash_cooldown.png").convert_alpha(), (40, 40))
+dash_icon_ready = asset_manager.load("assets/dash_ready.png", (40, 40))
+dash_icon_cooldown = asset_manager.load("assets/dash_cooldown.png", (40, 40))
 
 clock = pygame.time.Clock()
+timestep = FixedTimestep()
 
 # Load map and platforms
-platforms, walls = create_level()
+platforms, walls, collision_blocks = create_level()
+level_layer = LevelLayer(background, platforms, walls)
 
 # Create two players
 player1 = Player(100, 100, "assets/player1/walk_0.png", {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w, "dash": pygame.K_LSHIFT})
@@ -48,8 +43,8 @@ players = pygame.sprite.Group(player1, player2)
 game_over = False
 winner = None
 
-# Bullet group
-bullets = pygame.sprite.Group()
+# Bullets of both players
+bullets = BulletEngine(collision_blocks)
 
 def set_winner(player):
     global game_over, winner
@@ -57,8 +52,8 @@ def set_winner(player):
     winner = player.name
 
 def draw_end_menu(screen, winner):
-    font = pygame.font.SysFont("arial", 50)
-    button_font = pygame.font.SysFont("arial", 30)
+    font = hud.get_font("arial", 50)
+    button_font = hud.get_font("arial", 30)
 
     # Background
     overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
@@ -107,7 +102,7 @@ def draw_lives(surface, player, heart_img):
         x = start_x + i * (heart_width + spacing)
         surface.blit(heart_img, (x, y))
 
-def draw_gun(surface, player, image):
+def draw_gun(surface, player, rotations):
     if not player.alive:
         return
 
@@ -120,17 +115,13 @@ def draw_gun(surface, player, image):
     dy = mouse_y - player_center[1]
     angle = -math.degrees(math.atan2(dy, dx))
 
-    # Rotate image
-    rotated_gun = pygame.transform.rotate(image, angle)
-
     # Offset gun position slightly to sit on the shoulder
     offset_x = 20
     offset_y = 15
     gun_pos = (player_center[0] + offset_x, player_center[1] + offset_y)
 
-    # Adjust for rotated image size
-    gun_rect = rotated_gun.get_rect(center=gun_pos)
-    surface.blit(rotated_gun, gun_rect.topleft)
+    # Rotated copies are cached, centered on the gun position
+    rotations.blit(surface, angle, gun_pos)
 
 def draw_ammo(surface, player, bullet_img):
     if not player.alive:
@@ -176,7 +167,7 @@ def draw_game_over(screen, winner):
 # Game loop
 running = True
 while running:
-    clock.tick(FPS)
+    elapsed = clock.tick(FPS) / 1000
     keys = pygame.key.get_pressed()
 
     for event in pygame.event.get():
@@ -188,8 +179,7 @@ while running:
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 if player1.try_shoot():
                     mouse_pos = pygame.mouse.get_pos()
-                    bullet = Bullet(player1.rect.centerx, player1.rect.centery, mouse_pos, player1, bullet_projectile, set_winner)
-                    bullets.add(bullet)
+                    bullets.spawn(player1.rect.centerx, player1.rect.centery, mouse_pos, 0)
         else:
             if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
                 # Reset game
@@ -199,29 +189,28 @@ while running:
                 player2.respawn()
                 player1.rect.topleft = (100, 100)
                 player2.rect.topleft = (800, 100)
-                bullets.empty()
+                bullets.clear()
                 game_over = False
                 winner = None
 
-    # Update only if game is active
-    if not game_over:
-        players.update(platforms.sprites() + walls.sprites(), keys)
-        bullets.update()
-        for bullet in bullets:
-            bullet.check_collision(players, platforms.sprites() + walls.sprites())
+    # Update only if game is active, in fixed ticks whatever the frame rate
+    for _ in range(timestep.advance(elapsed)):
+        if not game_over:
+            players.update(collision_blocks, keys)
+            bullets.step()
+            for loser in bullets.collide([(0, player1.sim), (1, player2.sim)]):
+                set_winner(player1 if loser is player1.sim else player2)
 
     # Draw
-    screen.blit(background, (0, 0))
-    platforms.draw(screen)
-    walls.draw(screen)
-    bullets.draw(screen)
+    level_layer.draw(screen)
+    screen.blits([(bullet_projectile, pos) for pos in bullets.positions(timestep.alpha)])
     players.draw(screen)
 
     draw_lives(screen, player1, heart_img)
     draw_lives(screen, player2, heart_img)
     draw_ammo(screen, player1, bullet_img)
     draw_ammo(screen, player2, bullet_img)
-    draw_gun(screen, player1, gun_img)
+    draw_gun(screen, player1, gun_rotations)
     draw_dash_icon(screen, player1, dash_icon_ready, dash_icon_cooldown)
     draw_dash_icon(screen, player2, dash_icon_ready, dash_icon_cooldown)
 
@@ -245,7 +234,7 @@ while running:
                     player2.respawn()
                     player1.rect.topleft = (100, 100)
                     player2.rect.topleft = (800, 100)
-                    bullets.empty()
+                    bullets.clear()
                     game_over = False
                     winner = None
                 elif quit_btn.collidepoint(pygame.mouse.get_pos()):
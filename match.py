@@ -0,0 +1,92 @@
+# match.py
+import math
+
+import codec
+from bullet_engine import BulletEngine
+from simulation import SimPlayer, level_blocks
+
+SPAWN_POINTS = [(150, 100), (1050, 100)]
+AIM_DISTANCE = 100
+
+
+def step_player(player, collision_blocks, buttons):
+    # One tick of a SimPlayer for one input command, shared by the server and
+    # by client-side prediction so both run the exact same rules.
+    # Returns True when the player fired a bullet.
+    player.step(collision_blocks, buttons)
+    return bool(buttons & codec.INPUT_FIRE) and player.try_shoot()
+
+
+class Match:
+    # Authoritative simulation of one room, stepped by the server
+    def __init__(self):
+        self.collision_blocks = level_blocks()
+        self.bullets = BulletEngine(self.collision_blocks)
+        self.tick = 0  # keeps counting across resets, snapshots are keyed by it
+        self.reset()
+
+    def reset(self):
+        self.players = []
+        for i, (x, y) in enumerate(SPAWN_POINTS):
+            player = SimPlayer(x, y)
+            player.name = f"Player {i + 1}"
+            self.players.append(player)
+        self.bullets.clear()
+        self.game_over = False
+        self.winner = None
+
+    def set_winner(self, loser):
+        self.game_over = True
+        self.winner = self.players[1 - self.players.index(loser)].name
+
+    def spawn_bullet(self, player_id):
+        player = self.players[player_id]
+        angle = math.radians(player.gun_angle)
+        x, y = player.rect.center
+        target = (x + math.cos(angle) * AIM_DISTANCE, y - math.sin(angle) * AIM_DISTANCE)
+        self.bullets.spawn(x, y, target, player_id, self.tick)
+
+    def step(self, inputs):
+        # inputs holds, per player, one decoded input command, None (no
+        # buttons) or a list of commands to run in order. An empty list
+        # leaves that player as it is for this tick.
+        inputs = [commands if isinstance(commands, list) else [commands] for commands in inputs]
+        for commands in inputs:
+            if any(command and command["buttons"] & codec.INPUT_RESET for command in commands) and self.game_over:
+                self.reset()
+                self.tick += 1
+                return
+
+        if self.game_over:
+            return
+
+        self.tick += 1
+        for player_id, (player, commands) in enumerate(zip(self.players, inputs)):
+            for command in commands:
+                buttons = command["buttons"] if command else 0
+                if command:
+                    player.gun_angle = command["gun_angle"]
+                if step_player(player, self.collision_blocks, buttons):
+                    self.spawn_bullet(player_id)
+
+        self.bullets.step()
+        for loser in self.bullets.collide(enumerate(self.players)):
+            self.set_winner(loser)
+
+    def get_players_data(self):
+        return [p.get_data(p.gun_angle) for p in self.players]
+
+    def get_bullets_data(self):
+        return self.bullets.get_data()
+
+    def get_world(self, ack):
+        return codec.encode_world(self.tick, ack, self.get_players_data(), self.get_bullets_data(), self.winner)
+
+
+def simulate(ticks, policy, match=None):
+    # Steps a match as fast as the CPU allows, nothing here waits on a clock.
+    # policy(match) returns the next input command (or None) of each player.
+    match = match or Match()
+    for _ in range(ticks):
+        match.step(policy(match))
+    return match
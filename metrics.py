@@ -0,0 +1,217 @@
+# metrics.py
+# Counters, gauges and fixed-bucket histograms for the server, labelled per
+# room and per connection. A read-only JSON snapshot is served on loopback
+# and a summary line is logged periodically.
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds, the last bucket catches everything slower
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(Counter):
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        # Upper bound of the bucket the quantile falls in
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ("inf",), self.counts)},
+        }
+
+
+class Registry:
+    # name -> {labels -> metric}. Metrics are created under a lock, updates
+    # are plain attribute writes
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def get(self, kind, name, labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.metrics.setdefault(name, {})
+            metric = family.get(key)
+            if metric is None:
+                metric = family[key] = kind()
+            return metric
+
+    def counter(self, name, **labels):
+        return self.get(Counter, name, labels)
+
+    def gauge(self, name, **labels):
+        return self.get(Gauge, name, labels)
+
+    def histogram(self, name, **labels):
+        return self.get(Histogram, name, labels)
+
+    def remove(self, **labels):
+        # Drop every metric carrying these labels, e.g. a closed room
+        items = set(labels.items())
+        with self.lock:
+            for family in self.metrics.values():
+                for key in [key for key in family if items <= set(key)]:
+                    del family[key]
+
+    def total(self, name):
+        with self.lock:
+            return sum(metric.value for metric in self.metrics.get(name, {}).values())
+
+    def merged(self, name):
+        merged = Histogram()
+        with self.lock:
+            for metric in self.metrics.get(name, {}).values():
+                merged.merge(metric)
+        return merged
+
+    def snapshot(self):
+        with self.lock:
+            families = {name: list(family.items()) for name, family in self.metrics.items()}
+        return {
+            "uptime": time.time() - self.started,
+            "metrics": {
+                name: [dict(labels=dict(key), value=metric.snapshot()) for key, metric in family]
+                for name, family in families.items()
+            },
+        }
+
+
+registry = Registry()
+
+
+class ConnectionMetrics:
+    # Everything measured for one client, labelled with its room and player id
+    def __init__(self, room_id, player_id, registry=registry):
+        labels = {"room": room_id, "player": player_id}
+        self.registry = registry
+        self.labels = labels
+        self.messages_in = registry.counter("messages_in", **labels)
+        self.messages_out = registry.counter("messages_out", **labels)
+        self.bytes_in = registry.counter("bytes_in", **labels)
+        self.bytes_out = registry.counter("bytes_out", **labels)
+        self.decode_seconds = registry.histogram("decode_seconds", **labels)
+        self.handle_seconds = registry.histogram("handle_seconds", **labels)
+        self.errors = registry.counter("errors", **labels)
+
+    def received(self, data):
+        self.messages_in.inc()
+        self.bytes_in.inc(len(data))
+
+    def sent(self, data):
+        self.messages_out.inc()
+        self.bytes_out.inc(len(data))
+
+    def close(self):
+        self.registry.remove(**self.labels)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = registry
+
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = json.dumps(self.registry.snapshot()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the server log
+
+
+def serve(port, host="127.0.0.1"):
+    # Read-only: only GET is implemented, other methods get 501
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def log_line(registry, previous, elapsed):
+    # previous holds the totals from the last line, rates are per second
+    totals = {name: registry.total(name) for name in ("messages_in", "messages_out", "bytes_in", "bytes_out", "errors")}
+    rates = {name: (totals[name] - previous.get(name, 0)) / elapsed for name in totals}
+    previous.update(totals)
+    handle = registry.merged("handle_seconds")
+    tick = registry.merged("tick_seconds")
+    return (f"metrics: {registry.total('connections_active')} connections, {registry.total('rooms_active')} rooms, "
+            f"in {rates['messages_in']:.0f} msg/s {rates['bytes_in'] / 1024:.1f} KiB/s, "
+            f"out {rates['messages_out']:.0f} msg/s {rates['bytes_out'] / 1024:.1f} KiB/s, "
+            f"errors {rates['errors']:.1f}/s, handle p99 {handle.quantile(0.99) * 1000:.2f} ms, "
+            f"tick p99 {tick.quantile(0.99) * 1000:.2f} ms")
+
+
+def start_logging(interval, registry=registry):
+    def run():
+        previous = {}
+        while True:
+            time.sleep(interval)
+            print(log_line(registry, previous, interval))
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,177 @@
+# network.py
+import queue
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+import codec
+import settings
+
+
+class NetworkClient:
+    # Runs the socket I/O on background threads so the render loop never waits
+    # on a round-trip. Outgoing messages go through a queue, the newest decoded
+    # message from the server is published in a single slot that is swapped
+    # atomically, so readers never take a lock.
+    # With udp_address set, inputs and world state use UDP and the TCP
+    # connection only carries control messages.
+    def __init__(self, pro, coalesce=True, udp_address=None, token=None):
+        self.pro = pro
+        self.coalesce = coalesce  # only the newest state matters, drop stale ones
+        self.outgoing = queue.Queue()
+        self.latest = None  # (message number, message type, decoded data)
+        self.inbox = deque()  # (arrival time, message type, decoded data)
+        self.received = 0
+        self.world_decoder = codec.WorldDecoder()
+        self.connected = True
+        self.sender = threading.Thread(target=self.send_loop, daemon=True)
+        self.receiver = threading.Thread(target=self.receive_loop, daemon=True)
+
+        self.udp_socket = None
+        self.token = token
+        self.udp_ready = False  # set once the server started sending us datagrams
+        self.recent_inputs = deque(maxlen=settings.INPUT_REDUNDANCY)
+        self.last_world_tick = -1
+
+        # Statistics for the profiler
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.input_times = deque()  # (seq, send time) waiting for the server's ack
+        self.rtt = None
+        if udp_address:
+            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_socket.connect(udp_address)
+            self.udp_receiver = threading.Thread(target=self.udp_receive_loop, daemon=True)
+
+    def start(self):
+        self.sender.start()
+        self.receiver.start()
+        if self.udp_socket:
+            self.send_datagram(codec.encode_hello(self.token))
+            self.udp_receiver.start()
+
+    def stop(self):
+        self.connected = False
+        self.outgoing.put(None)
+        if self.udp_socket:
+            self.udp_socket.close()
+
+    def close(self, timeout=1.0):
+        # Flush whatever is queued (e.g. a quit message) before shutting down
+        self.outgoing.put(None)
+        self.sender.join(timeout)
+        self.connected = False
+
+    def drain(self):
+        # Everything received since the last call, in arrival order
+        messages = []
+        while self.inbox:
+            messages.append(self.inbox.popleft())
+        return messages
+
+    def send(self, data):
+        self.outgoing.put(data)
+
+    def send_input(self, seq, buttons, angle):
+        world_ack = self.world_decoder.last_tick
+        self.input_times.append((seq, time.monotonic()))
+        if self.udp_socket is None:
+            self.send(codec.encode_input(seq, buttons, angle, world_ack))
+            return
+
+        # A datagram never blocks, so it goes out straight from the caller
+        if not self.udp_ready:
+            self.send_datagram(codec.encode_hello(self.token))
+        self.recent_inputs.append((seq, buttons, angle, world_ack))
+        self.send_datagram(codec.encode_input_bundle(self.recent_inputs))
+
+    def send_datagram(self, data):
+        if settings.SIMULATED_LOSS and random.random() < settings.SIMULATED_LOSS:
+            return
+        try:
+            self.udp_socket.send(data)
+            self.bytes_sent += len(data)
+        except OSError:
+            pass  # e.g. the server's port is not open yet
+
+    def send_loop(self):
+        quit_message = codec.encode_quit()
+        stop = False
+        while self.connected and not stop:
+            data = self.outgoing.get()
+            if data is None:
+                break
+            batch = [data]
+            if self.coalesce:
+                # A newer state replaces the one waiting, a quit is never
+                # replaced and the stop sentinel ends the loop once what was
+                # queued before it has gone out
+                try:
+                    while batch[-1] != quit_message:
+                        newer = self.outgoing.get_nowait()
+                        if newer is None:
+                            stop = True
+                            break
+                        if newer == quit_message:
+                            batch.append(newer)
+                        else:
+                            batch[-1] = newer
+                except queue.Empty:
+                    pass
+            for data in batch:
+                self.pro.send_data(data)
+                self.bytes_sent += len(data) + 4  # length header
+
+    def receive_loop(self):
+        while self.connected:
+            raw_data = self.pro.get_data()
+            if not raw_data:
+                self.connected = False
+                break
+            self.bytes_received += len(raw_data) + 4
+            if self.handle_message(raw_data) == codec.MSG_QUIT:
+                break
+
+    def udp_receive_loop(self):
+        while self.connected:
+            try:
+                raw_data = self.udp_socket.recv(65535)
+            except OSError:
+                continue  # ICMP errors surface here, the socket is closed on stop
+            self.udp_ready = True
+            self.bytes_received += len(raw_data)
+            self.handle_message(raw_data)
+
+    def measure_rtt(self, ack):
+        # Time from sending an input to the first world state that includes it
+        sent_at = None
+        while self.input_times and self.input_times[0][0] <= ack:
+            seq, sent_at = self.input_times.popleft()
+        if sent_at is not None and seq == ack:
+            self.rtt = time.monotonic() - sent_at
+
+    def handle_message(self, raw_data):
+        try:
+            msg_type = codec.message_type(raw_data)
+            if msg_type == codec.MSG_STATE:
+                data = codec.decode_state(raw_data)
+            elif msg_type in (codec.MSG_WORLD, codec.MSG_WORLD_DELTA):
+                # Full and delta snapshots look the same to the game
+                data = self.world_decoder.decode(raw_data)
+                msg_type = codec.MSG_WORLD
+                if data["tick"] <= self.last_world_tick:
+                    return None  # duplicate or overtaken datagram
+                self.last_world_tick = data["tick"]
+                self.measure_rtt(data["ack"])
+            else:
+                data = None
+        except codec.CodecError as e:
+            print(f"Dropping bad message from server: {e}")
+            return None
+
+        self.received += 1
+        self.latest = (self.received, msg_type, data)
+        self.inbox.append((time.monotonic(), msg_type, data))
+        return msg_type
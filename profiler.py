@@ -0,0 +1,116 @@
+# profiler.py
+import csv
+import json
+import math
+
+import numpy as np
+import pygame
+
+import hud
+import settings
+
+PHASES = ("idle", "events", "network", "update", "draw")
+OVERLAY_REFRESH = 30  # frames between overlay redraws
+OVERLAY_COLOR = (255, 255, 0)
+OVERLAY_BACKGROUND = (0, 0, 0, 160)
+
+
+class FrameProfiler:
+    # Per-phase frame timings, network RTT and bytes per frame in a fixed-size
+    # ring buffer. When disabled the game loop skips it with a single check.
+    def __init__(self, size=settings.PROFILE_FRAMES, enabled=settings.PROFILE):
+        self.size = size
+        self.enabled = enabled
+        self.show_overlay = enabled
+        self.measures_rtt = True  # off when the network can't measure it
+        self.phases = np.zeros((size, len(PHASES)))  # seconds
+        self.rtt = np.full(size, np.nan)
+        self.bytes_in = np.zeros(size, dtype=np.int64)
+        self.bytes_out = np.zeros(size, dtype=np.int64)
+        self.index = 0     # next slot to write
+        self.recorded = 0  # frames recorded in total
+        self.last_totals = None
+        self.overlay = None
+
+    def toggle(self):
+        # F3: start recording and show the overlay, or hide both
+        self.enabled = self.show_overlay = not self.show_overlay
+        self.last_totals = None
+
+    def record(self, durations, rtt=None, totals=(0, 0)):
+        # durations in PHASES order, totals are the network byte counters
+        i = self.index
+        self.phases[i] = durations
+        self.rtt[i] = np.nan if rtt is None else rtt
+        if self.last_totals is None:
+            self.bytes_in[i] = self.bytes_out[i] = 0
+        else:
+            self.bytes_in[i] = totals[0] - self.last_totals[0]
+            self.bytes_out[i] = totals[1] - self.last_totals[1]
+        self.last_totals = totals
+        self.index = (i + 1) % self.size
+        self.recorded += 1
+        if self.recorded % OVERLAY_REFRESH == 0:
+            self.overlay = None
+
+    def ordered_slots(self):
+        # Buffer slots of the recorded frames, oldest first
+        count = min(self.recorded, self.size)
+        return np.arange(self.index - count, self.index) % self.size
+
+    def summary(self):
+        order = self.ordered_slots()
+        if not len(order):
+            return {}
+        phases = self.phases[order] * 1000
+        stats = {}
+        for name, column in zip(PHASES + ("frame",), list(phases.T) + [phases.sum(axis=1)]):
+            stats[name] = {
+                "p50": float(np.percentile(column, 50)),
+                "p99": float(np.percentile(column, 99)),
+                "max": float(column.max()),
+            }
+        rtt = self.rtt[order]
+        rtt = rtt[~np.isnan(rtt)] * 1000
+        if len(rtt):
+            stats["rtt"] = {"p50": float(np.percentile(rtt, 50)), "p99": float(np.percentile(rtt, 99)),
+                            "max": float(rtt.max())}
+        stats["bytes_in"] = {"mean": float(self.bytes_in[order].mean())}
+        stats["bytes_out"] = {"mean": float(self.bytes_out[order].mean())}
+        return stats
+
+    def get_overlay(self):
+        # Re-rendered every OVERLAY_REFRESH frames, text changes too often to cache
+        if self.overlay is None:
+            font = hud.get_font("consolas", 16)
+            lines = [f"{'ms':8}{'p50':>7}{'p99':>7}{'max':>7}"]
+            for name, stat in self.summary().items():
+                if "p50" in stat:
+                    lines.append(f"{name:8}{stat['p50']:7.2f}{stat['p99']:7.2f}{stat['max']:7.2f}")
+                else:
+                    lines.append(f"{name:8}{stat['mean']:7.0f} B/frame")
+            rendered = [font.render(line, True, OVERLAY_COLOR) for line in lines]
+            height = font.get_linesize()
+            self.overlay = pygame.Surface((max(r.get_width() for r in rendered) + 10, height * len(lines) + 10),
+                                          pygame.SRCALPHA)
+            self.overlay.fill(OVERLAY_BACKGROUND)
+            self.overlay.blits([(r, (5, 5 + i * height)) for i, r in enumerate(rendered)], False)
+        return self.overlay
+
+    def dump(self, path=settings.PROFILE_DUMP):
+        # <path>.csv has one row per recorded frame, <path>.json the summary
+        if not path or not self.recorded:
+            return
+        order = self.ordered_slots()
+        with open(f"{path}.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([f"{name}_ms" for name in PHASES] + ["rtt_ms"] * self.measures_rtt
+                            + ["bytes_in", "bytes_out"])
+            for i in order:
+                rtt = self.rtt[i]
+                rtt = [] if not self.measures_rtt else ["" if math.isnan(rtt) else round(rtt * 1000, 3)]
+                writer.writerow([round(d * 1000, 4) for d in self.phases[i]] + rtt
+                                + [int(self.bytes_in[i]), int(self.bytes_out[i])])
+        with open(f"{path}.json", "w") as f:
+            json.dump({"frames": len(order), "summary": self.summary()}, f, indent=2)
+        print(f"Profile written to {path}.csv and {path}.json")
@@ -1,23 +1,104 @@
 # protocol_server.py
-import pickle
+import asyncio
+import struct
+from collections import deque
+
+# Every message is prefixed with its length as a 4 byte big-endian integer
+HEADER = struct.Struct("!I")
+MAX_MESSAGE_SIZE = 1 << 20
+BUFFER_SIZE = 64 * 1024
+
+
 class Protocol:
-    def __init__(self, socket):
+    def __init__(self, socket, buffer_size=BUFFER_SIZE):
         self.socket = socket
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # first unread byte in the buffer
+        self.end = 0    # one past the last received byte
+        self.frames = deque()
+
+    def _parse_frames(self):
+        # Split every complete frame out of the buffer, keep the partial tail
+        while self.end - self.start >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer, self.start)
+            if length > MAX_MESSAGE_SIZE:
+                raise ValueError(f"message of {length} bytes is too large")
+            frame_end = self.start + HEADER.size + length
+            if frame_end > self.end:
+                if frame_end - self.start > len(self.buffer):
+                    self._grow(frame_end - self.start)
+                break
+            self.frames.append(bytes(self.view[self.start + HEADER.size:frame_end]))
+            self.start = frame_end
+
+        if self.start == self.end:
+            self.start = self.end = 0
+
+    def _grow(self, size):
+        buffer = bytearray(max(size, len(self.buffer) * 2))
+        buffer[:self.end - self.start] = self.view[self.start:self.end]
+        self.view.release()
+        self.buffer = buffer
+        self.view = memoryview(self.buffer)
+        self.end -= self.start
+        self.start = 0
+
+    def _fill(self):
+        # Move the partial frame to the front once the tail of the buffer runs out
+        if self.end == len(self.buffer) and self.start > 0:
+            remaining = self.end - self.start
+            self.view[:remaining] = self.view[self.start:self.end]
+            self.start, self.end = 0, remaining
+
+        received = self.socket.recv_into(self.view[self.end:])
+        if received == 0:
+            raise ConnectionError("connection closed")
+        self.end += received
+        self._parse_frames()
 
     def get_data(self):
         try:
-            length = self.socket.recv(4).decode()
-            data = self.socket.recv(int(length))
-            return data
+            while not self.frames:
+                self._fill()
+            return self.frames.popleft()
+        except Exception as e:
+            print(f"Receiving error: {e}")
+            return None
+
+    def get_all_data(self):
+        # Every complete message that is already buffered, at most one recv call
+        try:
+            if not self.frames:
+                self._fill()
+            frames = list(self.frames)
+            self.frames.clear()
+            return frames
         except Exception as e:
             print(f"Receiving error: {e}")
             return None
 
     def send_data(self, data):
         try:
-            length = str(len(data))
-            zfill_length = length.zfill(4).encode()
-            self.socket.sendall(zfill_length + data)
+            self.socket.sendall(HEADER.pack(len(data)) + data)
         except Exception as e:
             print(f"Sending error: {e}")
 
+
+async def read_frame(reader):
+    # asyncio counterpart of Protocol.get_data, StreamReader does the buffering
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (length,) = HEADER.unpack(header)
+        if length > MAX_MESSAGE_SIZE:
+            raise ValueError(f"message of {length} bytes is too large")
+        return await reader.readexactly(length)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    except Exception as e:
+        print(f"Receiving error: {e}")
+        return None
+
+
+def write_frame(writer, data):
+    writer.write(HEADER.pack(len(data)) + data)
@@ -0,0 +1,181 @@
+# replay.py
+# Match recordings. Every tick's world state is appended to a file in the
+# same encoding as the network world messages: a full snapshot every
+# keyframe_interval records and deltas against the previous tick in between.
+# Closing the file appends an index of (tick, offset) per record, so a reader
+# can memory-map it and jump to any tick after decoding at most one keyframe
+# interval. Without the index (the recorder crashed) it is rebuilt by a scan.
+# replay_viewer.py plays them back.
+import mmap
+import queue
+import struct
+import threading
+
+import numpy as np
+
+import codec
+import settings
+
+MAGIC = b"SBRP"
+INDEX_MAGIC = b"SBRI"
+FORMAT_VERSION = 2
+
+# magic, format version, players, records per keyframe, ticks per second
+FILE_HEADER = struct.Struct("<4sBBHH")
+# length of the world message that follows
+RECORD = struct.Struct("<H")
+# index offset, record count, magic. The index is every record's tick (u32)
+# followed by every record's offset (u64).
+FOOTER = struct.Struct("<QI4s")
+
+
+class ReplayError(ValueError):
+    pass
+
+
+class Recorder:
+    # Costs one quantize and encode per tick, records collect in memory and
+    # full chunks are written by a background thread
+    def __init__(self, path, player_count=2, tick_rate=settings.TICK_RATE,
+                 keyframe_interval=settings.REPLAY_KEYFRAME_INTERVAL, flush_size=settings.REPLAY_FLUSH_SIZE):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.flush_size = flush_size
+        self.buffer = bytearray(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, player_count, keyframe_interval, tick_rate))
+        self.written = 0  # bytes handed to the writer thread
+        self.ticks = []
+        self.offsets = []
+        self.baseline = None
+        self.last_tick = None
+        self.file = open(path, "wb")
+        self.chunks = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def record(self, tick, players, bullets, winner=None):
+        # players are data dicts or quantized tuples. A tick that is not
+        # newer than the last one (the match is over and holds) is skipped.
+        if self.last_tick is not None and tick <= self.last_tick:
+            return
+        players = tuple(p if isinstance(p, tuple) else codec.quantize_world_player(p) for p in players)
+        if (len(self.ticks) % self.keyframe_interval == 0 or self.baseline is None
+                or tick - self.last_tick >= codec.WORLD_HISTORY_SIZE):
+            data = codec.encode_world(tick, 0, players, bullets, winner)
+        else:
+            data = codec.encode_world_delta(tick, 0, players, self.last_tick, self.baseline, bullets, winner)
+
+        self.ticks.append(tick)
+        self.offsets.append(self.written + len(self.buffer))
+        self.buffer += RECORD.pack(len(data))
+        self.buffer += data
+        self.baseline, self.last_tick = players, tick
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.chunks.put(bytes(self.buffer))
+            self.written += len(self.buffer)
+            self.buffer = bytearray()
+
+    def write_loop(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            self.file.write(chunk)
+        self.file.close()
+
+    def close(self):
+        index_offset = self.written + len(self.buffer)
+        self.buffer += np.array(self.ticks, dtype="<u4").tobytes()
+        self.buffer += np.array(self.offsets, dtype="<u8").tobytes()
+        self.buffer += FOOTER.pack(index_offset, len(self.ticks), INDEX_MAGIC)
+        self.flush()
+        self.chunks.put(None)
+        self.writer.join()
+
+
+class ReplayReader:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ReplayError("empty replay file") from None
+        if len(self.data) < FILE_HEADER.size:
+            raise ReplayError("truncated replay header")
+        magic, version, self.player_count, self.keyframe_interval, self.tick_rate = FILE_HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ReplayError("not a replay file")
+        if version != FORMAT_VERSION:
+            raise ReplayError(f"unsupported replay version {version}")
+        if not self.load_index():
+            self.scan()
+        self.decoder = None
+        self.position = -1  # record the decoder last decoded
+        self.last_world = None
+
+    def load_index(self):
+        if len(self.data) < FILE_HEADER.size + FOOTER.size:
+            return False
+        index_offset, count, magic = FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+        if magic != INDEX_MAGIC or index_offset + count * 12 + FOOTER.size != len(self.data):
+            return False
+        self.ticks = np.frombuffer(self.data, dtype="<u4", count=count, offset=index_offset)
+        self.offsets = np.frombuffer(self.data, dtype="<u8", count=count, offset=index_offset + count * 4)
+        return True
+
+    def scan(self):
+        # Walk the records of a file that was never closed, a torn last record is dropped
+        ticks, offsets = [], []
+        offset = FILE_HEADER.size
+        while offset + RECORD.size + codec.HEADER.size + codec.WORLD.size <= len(self.data):
+            (length,) = RECORD.unpack_from(self.data, offset)
+            if offset + RECORD.size + length > len(self.data):
+                break
+            ticks.append(codec.WORLD.unpack_from(self.data, offset + RECORD.size + codec.HEADER.size)[0])
+            offsets.append(offset)
+            offset += RECORD.size + length
+        self.ticks = np.array(ticks, dtype="<u4")
+        self.offsets = np.array(offsets, dtype="<u8")
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def find(self, tick):
+        # Record index for a tick: direct while ticks are consecutive, which
+        # they are unless the recorder skipped some, else a binary search
+        i = tick - int(self.ticks[0]) if len(self.ticks) else 0
+        if 0 <= i < len(self.ticks) and self.ticks[i] == tick:
+            return i
+        i = int(np.searchsorted(self.ticks, tick, side="right")) - 1
+        return min(max(i, 0), len(self.ticks) - 1)
+
+    def raw(self, i):
+        offset = int(self.offsets[i])
+        (length,) = RECORD.unpack_from(self.data, offset)
+        return self.data[offset + RECORD.size:offset + RECORD.size + length]
+
+    def world(self, i):
+        # Playing forward decodes one record, anything else restarts from
+        # the keyframe at or before i
+        if not 0 <= i < len(self.ticks):
+            raise IndexError(i)
+        if i == self.position:
+            return self.last_world
+        if self.decoder is None or i != self.position + 1:
+            self.decoder = codec.WorldDecoder(self.player_count, codec.WORLD_HISTORY_SIZE)
+            for j in range(i - i % self.keyframe_interval, i):
+                self.decoder.decode(self.raw(j))
+        self.position = i
+        self.last_world = self.decoder.decode(self.raw(i))
+        return self.last_world
+
+    def world_at(self, tick):
+        return self.world(self.find(tick))
+
+    def close(self):
+        self.ticks = self.offsets = None  # views into the map must go before it closes
+        self.data.close()
+        self.file.close()
@@ -0,0 +1,101 @@
+# replay_viewer.py
+# Plays a recording through the normal client drawing code.
+#   python replay_viewer.py recordings/room-0-20240101-120000.replay
+# Space pauses, left/right step a tick while paused or seek a second while
+# playing, up/down change the speed, 0-9 jump to that tenth, Esc quits.
+import sys
+
+import pygame
+
+import hud
+import settings
+from client import GameClient
+from replay import ReplayReader
+
+SPEEDS = (0.25, 0.5, 1, 2, 4, 8)
+STATUS_COLOR = (255, 255, 0)
+
+
+class ReplayViewer(GameClient):
+    def __init__(self, path):
+        super().__init__()
+        self.reader = ReplayReader(path)
+        self.player_id = "0"
+        self.create_players()
+        self.clock = pygame.time.Clock()
+        pygame.display.set_caption(f"Replay - {path}")
+        self.position = 0.0  # fractional record index, advances with time while playing
+        self.speed = SPEEDS.index(1)
+        self.paused = False
+        self.tick = 0
+
+    @property
+    def index(self):
+        return int(self.position)
+
+    def seek(self, index):
+        self.position = float(min(max(index, 0), len(self.reader) - 1))
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                self.running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    self.paused = not self.paused
+                elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    step = 1 if self.paused else self.reader.tick_rate
+                    self.seek(self.index + (step if event.key == pygame.K_RIGHT else -step))
+                elif event.key == pygame.K_UP:
+                    self.speed = min(self.speed + 1, len(SPEEDS) - 1)
+                elif event.key == pygame.K_DOWN:
+                    self.speed = max(self.speed - 1, 0)
+                elif pygame.K_0 <= event.key <= pygame.K_9:
+                    self.seek((event.key - pygame.K_0) * len(self.reader) // 10)
+
+    def update(self, dt=0.0):
+        if not self.paused:
+            self.seek(self.position + dt * self.reader.tick_rate * SPEEDS[self.speed])
+        world = self.reader.world(self.index)
+        players = world["players"]
+        self.local_player.set_data(players[0])
+        self.local_player.snap()  # records are drawn as they are
+        self.enemy_player.set_data(players[1])
+        self.enemy_frame = players[1]["image"]
+        self.enemy_bullets_data = world["bullets"]  # every bullet, drawn like the enemy's
+        self.tick = world["tick"]
+        self.game_over = "game_over" in world
+        self.winner = world.get("game_over")
+
+    def draw_gun(self, surface, player, rotations, is_local, rect=None):
+        super().draw_gun(surface, player, rotations, False, rect)  # recorded angles, not the mouse
+
+    def draw_cursor(self):
+        # No cursor in the viewer, the status line is drawn in its place
+        state = "paused" if self.paused else f"x{SPEEDS[self.speed]}"
+        text = hud.get_font("consolas", 16).render(
+            f"tick {self.tick}  {self.index + 1}/{len(self.reader)}  {state}", True, STATUS_COLOR)
+        self.blit(text, (10, settings.SCREEN_HEIGHT - 26))
+
+    def draw_game_over(self):
+        # Just the banner, the buttons belong to a live match
+        win_text = hud.render_text(f"{self.winner} Wins!", 50, (255, 0, 0))
+        self.blit(win_text, win_text.get_rect(center=(settings.SCREEN_WIDTH // 2, settings.SCREEN_HEIGHT // 2 - 100)))
+
+    def run(self):
+        if not len(self.reader):
+            print("Replay has no records.")
+        while self.running and len(self.reader):
+            dt = self.clock.tick(settings.FPS) / 1000
+            self.handle_events()
+            self.update(dt)
+            self.draw()
+        self.reader.close()
+        pygame.quit()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python replay_viewer.py <file>")
+        raise SystemExit(2)
+    ReplayViewer(sys.argv[1]).run()
@@ -1,7 +1,19 @@
-import pickle
+import argparse
+import asyncio
+import os
+import random
+import secrets
 import socket
 import threading
+import time
+import traceback
+from collections import deque
 import protocol
+import codec
+import metrics
+import settings
+from match import Match
+from replay import Recorder
 
 
 class GameServer:
@@ -13,13 +25,18 @@ class GameServer:
         self.server_socket.listen(2)
         print(f"Server started on {self.host_ip}:{self.port}. Waiting for players...")
 
-        self.players_data = [{}, {}]
+        self.players_data = [codec.encode_empty(), codec.encode_empty()]
         self.connected_event = threading.Event()
         self.connected_clients = [None, None]
         self.player_count = 0
+        self.connections_active = metrics.registry.gauge("connections_active")
+        self.connections_total = metrics.registry.counter("connections_total")
 
     def handle_client(self, client_socket, player_id):
         print(f"Player {player_id} connected.")
+        conn = metrics.ConnectionMetrics(0, player_id)
+        self.connections_active.inc()
+        self.connections_total.inc()
 
         pro = protocol.Protocol(client_socket)
         pro.send_data(str(player_id).encode())
@@ -43,31 +60,40 @@ class GameServer:
                 if not raw_data:
                     print(f"Player {player_id} disconnected.")
                     break
-
-                # Handle quit signal
-                if raw_data == b"quit":
-                    print(f"Player {player_id} quit the game.")
-                    other_socket = self.connected_clients[1 - player_id]
-                    if other_socket:
-                        try:
-                            other_socket.sendall(b"quit")
-                        except:
-                            pass
-                    break
+                received_at = time.perf_counter()
+                conn.received(raw_data)
 
                 try:
-                    data = pickle.loads(raw_data)
-                    self.players_data[player_id] = data
-                    enemy_data = self.players_data[1 - player_id]
-                    pro.send_data(pickle.dumps(enemy_data))
+                    msg_type = codec.message_type(raw_data)
+
+                    # Handle quit signal
+                    if msg_type == codec.MSG_QUIT:
+                        print(f"Player {player_id} quit the game.")
+                        other_socket = self.connected_clients[1 - player_id]
+                        if other_socket:
+                            protocol.Protocol(other_socket).send_data(codec.encode_quit())
+                        break
+
+                    # Snapshots are relayed as-is, the server never decodes them
+                    codec.check_state(raw_data)
+                    conn.decode_seconds.observe(time.perf_counter() - received_at)
+                    self.players_data[player_id] = raw_data
+                    reply = self.players_data[1 - player_id]
+                    pro.send_data(reply)
+                    conn.sent(reply)
+                    conn.handle_seconds.observe(time.perf_counter() - received_at)
                 except Exception as e:
+                    conn.errors.inc()
                     print(f"Error processing data from player {player_id}: {e}")
                     break
 
         except Exception as e:
+            conn.errors.inc()
             print(f"Player {player_id} caused error: {e}")
 
-        self.players_data[player_id] = {}
+        self.players_data[player_id] = codec.encode_empty()
+        self.connections_active.dec()
+        conn.close()
         client_socket.close()
 
     def start(self):
@@ -85,10 +111,397 @@ class GameServer:
                 self.player_count += 1
             else:
                 print("Server full. Rejecting new connection.")
-                client_socket.send(b"Server full")
+                protocol.Protocol(client_socket).send_data(b"Server full")
                 client_socket.close()
 
 
+class Room:
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.players_data = [codec.encode_empty(), codec.encode_empty()]
+        self.writers = [None, None]
+        self.connections = [None, None]  # metrics.ConnectionMetrics per player
+        self.started = asyncio.Event()
+
+    def is_full(self):
+        return all(self.writers)
+
+    def is_empty(self):
+        return not any(self.writers)
+
+    def join(self, writer):
+        player_id = self.writers.index(None)
+        self.writers[player_id] = writer
+        self.connections[player_id] = metrics.ConnectionMetrics(self.room_id, player_id)
+        if self.is_full():
+            self.started.set()
+        return player_id
+
+    def leave(self, player_id):
+        self.writers[player_id] = None
+        self.players_data[player_id] = codec.encode_empty()
+        self.connections[player_id].close()
+        self.connections[player_id] = None
+
+    def send(self, player_id, data):
+        protocol.write_frame(self.writers[player_id], data)
+        self.connections[player_id].sent(data)
+
+    def handle_message(self, player_id, raw_data):
+        # Returns False once the player should be disconnected
+        msg_type = codec.message_type(raw_data)
+
+        if msg_type == codec.MSG_QUIT:
+            print(f"Room {self.room_id}: player {player_id} quit the game.")
+            if self.writers[1 - player_id]:
+                self.send(1 - player_id, codec.encode_quit())
+            return False
+
+        started = time.perf_counter()
+        codec.check_state(raw_data)
+        self.connections[player_id].decode_seconds.observe(time.perf_counter() - started)
+        self.players_data[player_id] = raw_data
+        self.send(player_id, self.players_data[1 - player_id])
+        return True
+
+
+class SimRoom(Room):
+    # Runs the match itself at a fixed tick rate, clients only send inputs
+    MAX_PENDING_INPUTS = 4
+
+    def __init__(self, room_id, send_datagram=None, record_dir=None):
+        super().__init__(room_id)
+        self.match = Match()
+        self.record_dir = record_dir
+        self.pending_inputs = [deque(), deque()]
+        self.acks = [0, 0]
+        self.world_acks = [0, 0]  # newest world tick each client confirmed
+        self.world_history = {}   # tick -> quantized players, baselines for deltas
+        self.world_bullets = (None, [])
+        self.last_seqs = [0, 0]
+        # With the UDP transport worlds are pushed every tick instead of
+        # being sent back for each input
+        self.send_datagram = send_datagram
+        self.udp_addrs = [None, None]
+        self.task = None
+        self.tick_seconds = metrics.registry.histogram("tick_seconds", room=room_id)
+        self.tick_lag_seconds = metrics.registry.histogram("tick_lag_seconds", room=room_id)
+        self.pending_gauge = metrics.registry.gauge("pending_inputs", room=room_id)
+
+    def join(self, writer):
+        player_id = super().join(writer)
+        if self.is_full() and self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+            self.task.add_done_callback(self.run_finished)
+        return player_id
+
+    def run_finished(self, task):
+        # A tick loop that died would leave both clients on a frozen match,
+        # so the error is logged and they are disconnected
+        if task.cancelled() or task.exception() is None:
+            return
+        error = task.exception()
+        print(f"Room {self.room_id}: match stopped by an error: {error!r}")
+        traceback.print_exception(type(error), error, error.__traceback__)
+        for writer in self.writers:
+            if writer:
+                writer.close()
+
+    def leave(self, player_id):
+        super().leave(player_id)
+        self.pending_inputs[player_id].clear()
+        self.world_acks[player_id] = 0
+        self.last_seqs[player_id] = 0
+        self.udp_addrs[player_id] = None
+        if self.is_empty() and self.task is not None:
+            self.task.cancel()
+
+    def next_inputs(self, player_id):
+        # The commands to run this tick. Each one is run exactly once and the
+        # ack names the last of them, so client prediction replays the same
+        # steps: a client with nothing new waits, one that fell behind runs
+        # several commands in one tick until it is back under the limit.
+        pending = self.pending_inputs[player_id]
+        count = min(len(pending), max(1, len(pending) - self.MAX_PENDING_INPUTS + 1))
+        commands = [pending.popleft() for _ in range(count)]
+        if commands:
+            self.acks[player_id] = commands[-1]["seq"]
+        return commands
+
+    async def run(self):
+        interval = 1 / settings.TICK_RATE
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        recorder = None
+        if self.record_dir:
+            path = os.path.join(self.record_dir, f"room-{self.room_id}-{time.strftime('%Y%m%d-%H%M%S')}.replay")
+            recorder = Recorder(path)
+            print(f"Room {self.room_id}: recording to {path}")
+        try:
+            while True:
+                started = time.perf_counter()
+                self.tick_lag_seconds.observe(max(0, loop.time() - next_tick))
+                self.pending_gauge.set(max(len(self.pending_inputs[0]), len(self.pending_inputs[1])))
+                self.match.step([self.next_inputs(0), self.next_inputs(1)])
+                if recorder:
+                    recorder.record(self.match.tick, self.match.get_players_data(), self.match.get_bullets_data(),
+                                    self.match.winner)
+                if self.send_datagram:
+                    for player_id, addr in enumerate(self.udp_addrs):
+                        if addr:
+                            data = self.encode_world(player_id)
+                            self.send_datagram(data, addr)
+                            self.connections[player_id].sent(data)
+                self.tick_seconds.observe(time.perf_counter() - started)
+                next_tick += interval
+                await asyncio.sleep(max(0, next_tick - loop.time()))
+        finally:
+            if recorder:
+                recorder.close()
+
+    def handle_message(self, player_id, raw_data):
+        msg_type = codec.message_type(raw_data)
+        if msg_type != codec.MSG_INPUT:
+            return super().handle_message(player_id, raw_data)
+
+        started = time.perf_counter()
+        command = codec.decode_input(raw_data)
+        self.connections[player_id].decode_seconds.observe(time.perf_counter() - started)
+        self.receive_inputs(player_id, [command])
+        self.send(player_id, self.encode_world(player_id))
+        return True
+
+    def receive_inputs(self, player_id, commands):
+        # Datagrams repeat recent inputs and may arrive late or twice,
+        # only commands newer than the last one seen are queued
+        for command in commands:
+            if command["seq"] <= self.last_seqs[player_id]:
+                continue
+            self.last_seqs[player_id] = command["seq"]
+            self.world_acks[player_id] = max(self.world_acks[player_id], command["world_ack"])
+            self.pending_inputs[player_id].append(command)
+
+    def encode_world(self, player_id):
+        # Delta against the last snapshot this client confirmed, or a full
+        # snapshot when that baseline is unknown (first packet, reconnect, too old)
+        tick = self.match.tick
+        players = self.world_history.get(tick)
+        if players is None:
+            players = tuple(codec.quantize_world_player(p) for p in self.match.get_players_data())
+            self.world_history[tick] = players
+            if len(self.world_history) > codec.WORLD_HISTORY_SIZE:
+                oldest = tick - codec.WORLD_HISTORY_SIZE
+                for old_tick in [t for t in self.world_history if t <= oldest]:
+                    del self.world_history[old_tick]
+            self.world_bullets = (tick, self.match.get_bullets_data())
+        bullets = self.world_bullets[1]
+
+        baseline_tick = self.world_acks[player_id]
+        baseline = self.world_history.get(baseline_tick) if baseline_tick else None
+        if baseline is None:
+            return codec.encode_world(tick, self.acks[player_id], players, bullets, self.match.winner)
+        return codec.encode_world_delta(tick, self.acks[player_id], players, baseline_tick, baseline,
+                                        bullets, self.match.winner)
+
+
+class StateDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def connection_made(self, transport):
+        self.server.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.server.handle_datagram(data, addr)
+
+    def error_received(self, exc):
+        pass  # a client went away, its TCP connection will tell us
+
+
+class AsyncGameServer:
+    # Hosts any number of two player rooms on a single event loop
+    def __init__(self, host="0.0.0.0", port=5555, authoritative=False, udp=False, loss=0.0, record_dir=None):
+        self.host_ip = host
+        self.port = port
+        self.authoritative = authoritative or udp
+        self.udp = udp
+        self.loss = loss  # simulated packet loss for testing over loopback
+        self.record_dir = record_dir
+        self.start_signal = b"start auth" if self.authoritative else b"start"
+        self.rooms = {}
+        self.waiting_room = None
+        self.next_room_id = 0
+        self.transport = None
+        self.sessions = {}     # UDP token -> (room, player id)
+        self.udp_clients = {}  # UDP address -> (room, player id)
+        self.connections_active = metrics.registry.gauge("connections_active")
+        self.connections_total = metrics.registry.counter("connections_total")
+        self.rooms_active = metrics.registry.gauge("rooms_active")
+
+    def new_room(self, room_id):
+        if not self.authoritative:
+            return Room(room_id)
+        return SimRoom(room_id, self.send_datagram if self.udp else None, self.record_dir)
+
+    def send_datagram(self, data, addr):
+        if self.loss and random.random() < self.loss:
+            return
+        self.transport.sendto(data, addr)
+
+    def handle_datagram(self, data, addr):
+        try:
+            msg_type = codec.message_type(data)
+            if msg_type == codec.MSG_HELLO:
+                session = self.sessions.get(codec.decode_hello(data))
+                if session is None:
+                    return
+                room, player_id = session
+                old_addr = room.udp_addrs[player_id]
+                if old_addr and old_addr != addr:
+                    self.udp_clients.pop(old_addr, None)
+                room.udp_addrs[player_id] = addr
+                self.udp_clients[addr] = session
+
+            elif msg_type == codec.MSG_INPUT_BUNDLE:
+                session = self.udp_clients.get(addr)
+                if session is None:
+                    return
+                room, player_id = session
+                conn = room.connections[player_id]
+                conn.received(data)
+                started = time.perf_counter()
+                commands = codec.decode_input_bundle(data)
+                conn.decode_seconds.observe(time.perf_counter() - started)
+                room.receive_inputs(player_id, commands)
+                conn.handle_seconds.observe(time.perf_counter() - started)
+        except codec.CodecError:
+            metrics.registry.counter("bad_datagrams").inc()  # stray or corrupt datagram
+
+    def assign_room(self, writer):
+        if self.waiting_room is None or self.waiting_room.is_full():
+            self.waiting_room = self.new_room(self.next_room_id)
+            self.rooms[self.waiting_room.room_id] = self.waiting_room
+            self.rooms_active.set(len(self.rooms))
+            self.next_room_id += 1
+        room = self.waiting_room
+        player_id = room.join(writer)
+        if room.is_full():
+            self.waiting_room = None
+        return room, player_id
+
+    async def handle_client(self, reader, writer):
+        print(f"Connected to {writer.get_extra_info('peername')}")
+        room, player_id = self.assign_room(writer)
+        print(f"Room {room.room_id}: player {player_id} connected.")
+        conn = room.connections[player_id]
+        self.connections_active.inc()
+        self.connections_total.inc()
+        token = None
+
+        try:
+            protocol.write_frame(writer, str(player_id).encode())
+            await writer.drain()
+
+            # Wait for the second player, or for this one to hang up first
+            waiting = asyncio.ensure_future(room.started.wait())
+            closed = asyncio.ensure_future(reader.read(1))
+            await asyncio.wait((waiting, closed), return_when=asyncio.FIRST_COMPLETED)
+            for task in (waiting, closed):
+                task.cancel()
+            await asyncio.gather(waiting, closed, return_exceptions=True)
+            if not room.started.is_set():
+                print(f"Room {room.room_id}: player {player_id} left before the match started.")
+                return
+
+            start_signal = self.start_signal
+            if self.udp:
+                # State goes over UDP, the token ties the datagrams to this connection
+                token = secrets.randbits(32)
+                self.sessions[token] = (room, player_id)
+                start_signal += b" udp %d" % token
+            protocol.write_frame(writer, start_signal)
+            await writer.drain()
+
+            while True:
+                raw_data = await protocol.read_frame(reader)
+                if not raw_data:
+                    print(f"Room {room.room_id}: player {player_id} disconnected.")
+                    break
+                conn.received(raw_data)
+
+                started = time.perf_counter()
+                try:
+                    if not room.handle_message(player_id, raw_data):
+                        break
+                except Exception as e:
+                    conn.errors.inc()
+                    print(f"Room {room.room_id}: error processing data from player {player_id}: {e}")
+                    break
+                conn.handle_seconds.observe(time.perf_counter() - started)
+                await writer.drain()
+
+        except Exception as e:
+            conn.errors.inc()
+            print(f"Room {room.room_id}: player {player_id} caused error: {e}")
+
+        finally:
+            if token is not None:
+                self.sessions.pop(token, None)
+            if isinstance(room, SimRoom) and room.udp_addrs[player_id]:
+                self.udp_clients.pop(room.udp_addrs[player_id], None)
+            room.leave(player_id)
+            if room is self.waiting_room and room.is_empty():
+                self.waiting_room = None
+            if room.is_empty():
+                self.rooms.pop(room.room_id, None)
+                self.rooms_active.set(len(self.rooms))
+                metrics.registry.remove(room=room.room_id)
+            self.connections_active.dec()
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_client, self.host_ip, self.port, backlog=512)
+        if self.udp:
+            loop = asyncio.get_running_loop()
+            await loop.create_datagram_endpoint(lambda: StateDatagramProtocol(self),
+                                                local_addr=(self.host_ip, self.port))
+        print(f"Async server started on {self.host_ip}:{self.port}. Waiting for players...")
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        asyncio.run(self.serve())
+
+
 if __name__ == "__main__":
-    server = GameServer()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="host many rooms on one asyncio event loop")
+    parser.add_argument("--authoritative", action="store_true",
+                        help="simulate matches on the server, clients only send inputs (implies --async)")
+    parser.add_argument("--udp", action="store_true",
+                        help="send inputs and world state over UDP (implies --authoritative)")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="drop this fraction of outgoing datagrams, for testing")
+    parser.add_argument("--metrics-port", type=int, default=settings.METRICS_PORT,
+                        help="serve a JSON metrics snapshot on this loopback port (0 to disable)")
+    parser.add_argument("--metrics-interval", type=float, default=settings.METRICS_LOG_INTERVAL,
+                        help="seconds between metrics log lines (0 to disable)")
+    parser.add_argument("--record", default=settings.RECORD_DIR, metavar="DIR",
+                        help="record every authoritative match to a replay file in this directory")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.metrics_interval:
+        metrics.start_logging(args.metrics_interval)
+
+    if args.use_async or args.authoritative or args.udp:
+        if args.record:
+            os.makedirs(args.record, exist_ok=True)
+        server = AsyncGameServer(args.host, args.port, args.authoritative, args.udp, args.loss, args.record)
+    else:
+        server = GameServer(args.host, args.port)
     server.start()
\ No newline at end of file
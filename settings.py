@@ -6,7 +6,7 @@ PORT = 5555
 
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
-FPS = 60
+FPS = 60                     # render frames per second at most, 0 for as many as the display allows
 
 # Colors
 WHITE = (255, 255, 255)
@@ -15,7 +15,47 @@ PLAYER_RED = (255, 50, 50)
 PLAYER_BLUE = (50, 50, 255)
 PLATFORM_COLOR = (60, 60, 60)
 
-# Physics
-GRAVITY = 0.5
-JUMP_SPEED = -10
-PLAYER_SPEED = 5
\ No newline at end of file
+# Physics, per second. The simulation converts them to per-tick steps.
+GRAVITY = 1800               # px/s^2
+JUMP_SPEED = -600            # px/s
+PLAYER_SPEED = 300           # px/s
+MAX_FALL_SPEED = 600         # px/s
+
+# Timers, in seconds
+DASH_COOLDOWN = 2.0
+AMMO_COOLDOWN = 3.0          # per round regained
+RESPAWN_TIME = 2.0
+
+# Simulation
+TICK_RATE = 60               # fixed ticks per second on the server and the client, whatever the frame rate
+MAX_TICKS_PER_FRAME = 5      # catch-up limit after a stall, the rest of the backlog is dropped
+
+# Networking
+NET_SEND_RATE = 20           # relay snapshots per second
+INTERP_DELAY = 0.1           # seconds remote players are rendered in the past
+MAX_EXTRAPOLATION = 0.25     # seconds we keep extrapolating when packets are late
+SNAPSHOT_BUFFER_SIZE = 32
+CLIENT_PREDICTION = True     # authoritative mode: apply local inputs before the server confirms them
+INPUT_HISTORY_SIZE = 256     # unacknowledged inputs kept for replay
+INPUT_REDUNDANCY = 4         # UDP: recent inputs repeated in every datagram
+SIMULATED_LOSS = 0.0         # UDP: fraction of outgoing datagrams dropped, for testing
+
+# Rendering
+GUN_ROTATION_STEP = 3        # degrees, gun sprites are rotated to multiples of this
+ROTATION_CACHE_SIZE = 128    # rotated surfaces kept per image
+DIRTY_RECTS = False          # redraw and update only the regions that changed each frame
+
+# Profiling
+PROFILE = False              # record frame timings from the start (F3 toggles it in game)
+PROFILE_FRAMES = 600         # frames kept in the ring buffer
+PROFILE_DUMP = "profile"     # written to profile.csv / profile.json on exit, empty to skip
+
+# Server metrics
+METRICS_PORT = 0             # loopback port for the read-only JSON endpoint, 0 to disable
+METRICS_LOG_INTERVAL = 30    # seconds between metrics log lines, 0 to disable
+
+# Replays
+RECORD_DIR = ""                  # server: directory authoritative matches are recorded to, empty to skip
+RECORD_REPLAY = ""               # client: file its match is recorded to, empty to skip
+REPLAY_KEYFRAME_INTERVAL = 60    # records between full snapshots, bounds the work of a seek
+REPLAY_FLUSH_SIZE = 64 * 1024    # bytes collected before a chunk goes to the writer thread
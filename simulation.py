@@ -0,0 +1,431 @@
+# simulation.py
+# Game rules without pygame: physics, collision, ammo, dash and respawn.
+# The sprites in player.py and level.py are views over these objects,
+# bullets live in bullet_engine.py, and the server, bots and tools step
+# them with no display at all.
+import math
+
+import codec
+from settings import *
+
+PLAYER_SIZE = (50, 75)
+BULLET_SIZE = (20, 20)
+BULLET_SPEED = 600         # px/s
+WALK_ANIMATION_RATE = 12   # walk frames per second
+WALK_FRAMES = 4
+GRID_CELL_SIZE = 128
+
+# Per-tick steps of the per-second rates
+GRAVITY_STEP = GRAVITY / TICK_RATE ** 2
+JUMP_STEP = JUMP_SPEED / TICK_RATE
+WALK_STEP = PLAYER_SPEED / TICK_RATE
+MAX_FALL_STEP = MAX_FALL_SPEED / TICK_RATE
+BULLET_STEP = BULLET_SPEED / TICK_RATE
+
+
+def ticks(seconds):
+    # Timers count simulation ticks
+    return round(seconds * TICK_RATE)
+
+
+LEVEL_PLATFORMS = [
+    (0, 680, 1280, 40),
+    (80, 600, 180, 20),
+    (1020, 600, 180, 20),
+    (570, 460, 120, 20),
+    (570, 340, 120, 20),
+    (570, 220, 120, 20),
+    (250, 480, 100, 20),
+    (930, 480, 100, 20),
+    (370, 360, 100, 20),
+    (810, 360, 100, 20),
+    (150, 240, 100, 20),
+    (1030, 240, 100, 20),
+    (590, 60, 100, 20),
+]
+
+LEVEL_WALLS = [
+    # Middle towers
+    (480, 400, 40, 120),
+    (760, 400, 40, 120),
+    (480, 280, 40, 120),
+    (760, 280, 40, 120),
+    (480, 160, 40, 120),
+    (760, 160, 40, 120),
+
+    # Map boundary walls (left/right)
+    (0, 0, 20, SCREEN_HEIGHT),  # Left wall
+    (SCREEN_WIDTH - 20, 0, 20, SCREEN_HEIGHT),  # Right wall
+
+    #extra visual floor edge walls
+    (0, SCREEN_HEIGHT - 60, 40, 60),
+    (SCREEN_WIDTH - 40, SCREEN_HEIGHT - 60, 40, 60),
+]
+
+
+def to_int(value):
+    # Same rounding pygame.Rect applies to float coordinates
+    if isinstance(value, int):
+        return value
+    return int(math.floor(value + 0.5)) if value >= 0 else -int(math.floor(0.5 - value))
+
+
+class Box:
+    # Integer rectangle with the parts of the pygame.Rect API the game uses.
+    # It is also a 4 item sequence, so pygame accepts it wherever a rect goes.
+    __slots__ = ("x", "y", "w", "h")
+
+    def __init__(self, x, y, w, h):
+        self.x = to_int(x)
+        self.y = to_int(y)
+        self.w = w
+        self.h = h
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, i):
+        return (self.x, self.y, self.w, self.h)[i]
+
+    def __repr__(self):
+        return f"<Box({self.x}, {self.y}, {self.w}, {self.h})>"
+
+    @property
+    def left(self):
+        return self.x
+
+    @left.setter
+    def left(self, value):
+        self.x = to_int(value)
+
+    @property
+    def right(self):
+        return self.x + self.w
+
+    @right.setter
+    def right(self, value):
+        self.x = to_int(value) - self.w
+
+    @property
+    def top(self):
+        return self.y
+
+    @top.setter
+    def top(self, value):
+        self.y = to_int(value)
+
+    @property
+    def bottom(self):
+        return self.y + self.h
+
+    @bottom.setter
+    def bottom(self, value):
+        self.y = to_int(value) - self.h
+
+    @property
+    def centerx(self):
+        return self.x + self.w // 2
+
+    @property
+    def centery(self):
+        return self.y + self.h // 2
+
+    @property
+    def center(self):
+        return (self.x + self.w // 2, self.y + self.h // 2)
+
+    @center.setter
+    def center(self, value):
+        self.x = to_int(value[0]) - self.w // 2
+        self.y = to_int(value[1]) - self.h // 2
+
+    @property
+    def topleft(self):
+        return (self.x, self.y)
+
+    @topleft.setter
+    def topleft(self, value):
+        self.x = to_int(value[0])
+        self.y = to_int(value[1])
+
+    @property
+    def size(self):
+        return (self.w, self.h)
+
+    def move(self, dx, dy):
+        return Box(self.x + dx, self.y + dy, self.w, self.h)
+
+    def copy(self):
+        return Box(self.x, self.y, self.w, self.h)
+
+    def colliderect(self, other):
+        return (self.x < other.x + other.w and other.x < self.x + self.w
+                and self.y < other.y + other.h and other.y < self.y + self.h)
+
+
+class LevelIndex:
+    # Uniform grid over the static level rects, built once and never changed.
+    # query() only returns blocks sharing a cell with the rect, so collision
+    # cost depends on what is nearby rather than on the size of the level.
+    def __init__(self, blocks, cell_size=GRID_CELL_SIZE):
+        self.blocks = tuple(blocks)
+        self.cell_size = cell_size
+        cells = {}
+        for i, block in enumerate(self.blocks):
+            for cell in self.cells_for(block):
+                cells.setdefault(cell, []).append(i)
+        self.cells = {cell: tuple(ids) for cell, ids in cells.items()}
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def cells_for(self, rect):
+        size = self.cell_size
+        x0, x1 = rect.left // size, (rect.right - 1) // size
+        y0, y1 = rect.top // size, (rect.bottom - 1) // size
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+    def query(self, rect):
+        # Nearby blocks in level order, so collisions resolve the same way a
+        # full scan would
+        cells = self.cells_for(rect)
+        if len(cells) == 1:
+            return [self.blocks[i] for i in self.cells.get(cells[0], ())]
+        found = set()
+        for cell in cells:
+            found.update(self.cells.get(cell, ()))
+        return [self.blocks[i] for i in sorted(found)]
+
+
+def sweep(rect, blocks, dx=0, dy=0):
+    # Time of impact of rect moving along one axis through the static blocks,
+    # found with one query over the whole swept area instead of small steps.
+    # Returns how far it can move (toward dx or dy) and the block it stops at.
+    if dx:
+        swept = Box(min(rect.x, rect.x + dx), rect.y, rect.w + abs(dx), rect.h)
+    else:
+        swept = Box(rect.x, min(rect.y, rect.y + dy), rect.w, rect.h + abs(dy))
+    distance, hit = abs(dx or dy), None
+    for block in blocks.query(swept):
+        if dx:
+            if block.y >= rect.bottom or rect.y >= block.bottom:
+                continue  # not in the way
+            gap = block.x - rect.right if dx > 0 else rect.x - block.right
+        else:
+            if block.x >= rect.right or rect.x >= block.right:
+                continue
+            gap = block.y - rect.bottom if dy > 0 else rect.y - block.bottom
+        if 0 <= gap < distance:  # overlaps are push_out's job, not this
+            distance, hit = gap, block
+    return distance, hit
+
+
+def push_out(rect, blocks):
+    # Moves a rect that starts inside blocks (a respawn, a snapshot, a level
+    # edit) out the shortest way, up first on ties, so sweep never has to
+    # handle an overlap.
+    for block in blocks.query(rect):
+        if not rect.colliderect(block):
+            continue
+        exits = ((0, block.y - rect.bottom), (0, block.bottom - rect.y),
+                 (block.x - rect.right, 0), (block.right - rect.x, 0))
+        dx, dy = min(exits, key=lambda exit: abs(exit[0] + exit[1]))
+        rect.x += dx
+        rect.y += dy
+
+
+def level_blocks():
+    # Everything players and bullets collide with
+    return LevelIndex(Box(*r) for r in LEVEL_PLATFORMS + LEVEL_WALLS)
+
+
+class SimPlayer:
+    def __init__(self, x, y):
+        self.rect = Box(x, y, *PLAYER_SIZE)
+        self.animation_index = 0
+        self.animation_speed = WALK_ANIMATION_RATE / TICK_RATE  # frames per tick
+        self.facing_right = True
+
+        self.can_dash = True
+        self.dash_cooldown = 0  # ticks
+        self.dash_distance = 100
+        self.dash_cooldown_max = ticks(DASH_COOLDOWN)
+
+        self.vx = 0
+        self.vy = 0
+        self.sub_x = 0.0  # sub-pixel part of the position, the rect holds whole pixels
+        self.sub_y = 0.0
+        self.on_ground = False
+        self.jump_count = 0
+        self.max_jumps = 2
+        self.jump_key_held = False
+
+        self.lives = 3
+        self.respawn_timer = 0
+        self.alive = True
+        self.spawn_point = (x, y)
+
+        self.max_ammo = 3
+        self.ammo = self.max_ammo
+        self.ammo_cooldown = ticks(AMMO_COOLDOWN)
+        self.ammo_timer = 0
+        self.gun_angle = 0
+
+    def handle_input(self, blocks, buttons):
+        self.vx = 0
+
+        if buttons & codec.INPUT_DASH and self.can_dash:
+            direction = 1 if self.facing_right else -1
+            moved, _ = sweep(self.rect, blocks, dx=self.dash_distance * direction)
+            self.rect.x += moved * direction
+
+            if moved != 0:
+                self.can_dash = False
+                self.dash_cooldown = self.dash_cooldown_max
+
+        if buttons & codec.INPUT_LEFT:
+            self.vx = -WALK_STEP
+        if buttons & codec.INPUT_RIGHT:
+            self.vx = WALK_STEP
+
+        if buttons & codec.INPUT_JUMP:
+            if not self.jump_key_held and self.jump_count < self.max_jumps:
+                self.vy = JUMP_STEP
+                self.jump_count += 1
+                self.jump_key_held = True
+        else:
+            self.jump_key_held = False
+
+    def apply_gravity(self):
+        self.vy += GRAVITY_STEP
+        if self.vy > MAX_FALL_STEP:
+            self.vy = MAX_FALL_STEP
+
+    def step(self, blocks, buttons):
+        if self.dash_cooldown > 0:
+            self.dash_cooldown -= 1
+        else:
+            self.can_dash = True
+
+        if not self.alive:
+            self.respawn_timer -= 1
+            if self.respawn_timer <= 0:
+                self.respawn()
+            return
+
+        push_out(self.rect, blocks)
+        self.handle_input(blocks, buttons)
+        self.apply_gravity()
+        self.move_horizontal(blocks, self.vx)
+        self.move_vertical(blocks, self.vy)
+
+        if self.ammo < self.max_ammo:  # ammo regeneration
+            self.ammo_timer -= 1
+            if self.ammo_timer <= 0:
+                self.ammo += 1
+                if self.ammo < self.max_ammo:
+                    self.ammo_timer = self.ammo_cooldown
+
+        if self.vx != 0:  # animations
+            self.animation_index += self.animation_speed
+            if self.animation_index >= WALK_FRAMES:
+                self.animation_index = 0
+            self.facing_right = self.vx > 0
+
+    def move_horizontal(self, blocks, dx):
+        # Stops flush against the first block in the way, at any speed. The
+        # rect moves whole pixels, the fraction carries over to the next tick
+        # so speeds don't depend on the tick rate.
+        self.sub_x += dx
+        dx = to_int(self.sub_x)
+        self.sub_x -= dx
+        if dx:
+            moved, block = sweep(self.rect, blocks, dx=dx)
+            self.rect.x += moved if dx > 0 else -moved
+            if block is not None:
+                self.sub_x = 0.0
+
+    def move_vertical(self, blocks, dy):
+        self.on_ground = False
+        self.sub_y += dy
+        dy = to_int(self.sub_y)
+        self.sub_y -= dy
+        if not dy:
+            return
+        moved, block = sweep(self.rect, blocks, dy=dy)
+        self.rect.y += moved if dy > 0 else -moved
+        if block is not None:
+            self.vy = 0
+            self.sub_y = 0.0
+            if dy > 0:
+                self.on_ground = True
+                self.jump_count = 0  # Reset jump count on landing
+
+    def respawn(self):
+        self.rect.topleft = self.spawn_point
+        self.vx = 0
+        self.vy = 0
+        self.sub_x = self.sub_y = 0.0
+        self.alive = True
+
+    def take_hit(self):
+        # Returns True when that was the last life
+        self.lives -= 1
+        self.alive = False
+        self.respawn_timer = ticks(RESPAWN_TIME)
+        return self.lives <= 0
+
+    def try_shoot(self):
+        if self.ammo > 0 and self.alive:
+            self.ammo -= 1
+            self.ammo_timer = self.ammo_cooldown
+            return True
+        return False
+
+    def get_data(self, gun_angle=None):
+        return {
+            "x": self.rect.x,
+            "y": self.rect.y,
+            "lives": self.lives,
+            "ammo": self.ammo,
+            "image": self.animation_index,
+            "facing_right": self.facing_right,
+            "gun_angle": self.gun_angle if gun_angle is None else gun_angle,
+            "alive": self.alive,
+            "respawn_timer": self.respawn_timer,
+            "can_dash": self.can_dash,
+            "vy": self.vy,
+            "sub_x": self.sub_x,
+            "sub_y": self.sub_y,
+            "on_ground": self.on_ground,
+            "jump_key_held": self.jump_key_held,
+            "jump_count": self.jump_count,
+            "dash_cooldown": self.dash_cooldown,
+            "ammo_timer": self.ammo_timer,
+        }
+
+    def set_data(self, data):
+        self.rect.x = to_int(data["x"])
+        self.rect.y = to_int(data["y"])
+        self.lives = data["lives"]
+        self.ammo = data["ammo"]
+        self.animation_index = data["image"]
+        self.facing_right = data["facing_right"]
+        self.gun_angle = data["gun_angle"]
+        self.alive = data.get("alive", True)
+        self.respawn_timer = data.get("respawn_timer", 0)
+        self.can_dash = data.get("can_dash", True)
+
+        # Full physics state is only present in authoritative world snapshots
+        if "vy" in data:
+            self.vy = data["vy"]
+            self.sub_x = data["sub_x"]
+            self.sub_y = data["sub_y"]
+            self.on_ground = data["on_ground"]
+            self.jump_key_held = data["jump_key_held"]
+            self.jump_count = data["jump_count"]
+            self.dash_cooldown = data["dash_cooldown"]
+            self.ammo_timer = data["ammo_timer"]
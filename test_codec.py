@@ -0,0 +1,202 @@
+# test_codec.py
+# Round trips for the wire format.
+#   python -m pytest -q
+import random
+
+import pytest
+
+import codec
+
+STATE = {
+    "time": 123456,
+    "x": 150,
+    "y": -20,
+    "lives": 2,
+    "ammo": 1,
+    "image": 2.5,
+    "facing_right": False,
+    "gun_angle": -135.25,
+    "alive": True,
+    "respawn_timer": 0,
+    "can_dash": True,
+    "bullets": [
+        {"id": 7, "x": 300, "y": 410, "target": (640, 360), "source_id": 0},
+        {"id": 65535, "x": -10, "y": 0, "target": (0, -5), "source_id": 1},
+    ],
+}
+
+PLAYER = {
+    "x": 150,
+    "y": 100,
+    "vy": -7.5,
+    "lives": 3,
+    "ammo": 3,
+    "image": 1.5,
+    "facing_right": True,
+    "gun_angle": 45.25,
+    "alive": True,
+    "respawn_timer": 0,
+    "can_dash": True,
+    "on_ground": False,
+    "jump_key_held": True,
+    "dash_cooldown": 0,
+    "ammo_timer": 0,
+    "jump_count": 1,
+    "sub_x": 0.0,
+    "sub_y": 0.0,
+}
+
+
+def world_player(player_id, tick):
+    # Moves every tick and changes its other fields now and then, with
+    # values the wire format holds exactly
+    return dict(PLAYER, x=150 + player_id * 900 + tick % 200, y=100 + tick % 7, vy=(tick % 9 - 4) / 2,
+                lives=3 - tick // 400 % 3, ammo=tick // 50 % 4, image=tick % 40 / 10,
+                facing_right=tick // 30 % 2 == 0, gun_angle=player_id * 90 - tick % 180 + 0.25,
+                alive=tick % 100 < 90, respawn_timer=max(0, tick % 100 - 90), can_dash=tick % 120 < 60,
+                on_ground=tick % 7 == 0, dash_cooldown=max(0, 60 - tick % 120), jump_count=tick % 3,
+                sub_x=(tick % 5 - 2) / 8, sub_y=(tick % 3 - 1) / 4)
+
+
+def world(tick):
+    # (tick, players, bullets, winner), a winner every 50th tick
+    bullets = [{"id": tick + i, "x": 200 + tick % 300 + i * 40, "y": 300 - i, "target": (640, 360 + i),
+                "source_id": i % 2} for i in range(tick % 5)]
+    return tick, [world_player(0, tick), world_player(1, tick)], bullets, "Player 2" if tick % 50 == 0 else None
+
+
+def decoded(tick, players, bullets, winner, ack=0):
+    expected = {"tick": tick, "ack": ack, "players": players, "bullets": bullets}
+    if winner is not None:
+        expected["game_over"] = winner
+    return expected
+
+
+def quantized(players):
+    return tuple(codec.quantize_world_player(p) for p in players)
+
+
+def truncations(raw):
+    # Every proper prefix that still has a valid header
+    return [raw[:n] for n in range(codec.HEADER.size, len(raw))]
+
+
+def with_version(raw, version):
+    return bytes([version]) + raw[1:]
+
+
+def test_state_round_trip():
+    raw = codec.encode_state(dict(STATE, game_over="Player 1"))
+    codec.check_state(raw)
+    assert codec.decode_state(raw) == dict(STATE, game_over="Player 1")
+    assert codec.decode_state(codec.encode_state(STATE)) == STATE
+    assert codec.decode_state(codec.encode_state(dict(STATE, bullets=[])))["bullets"] == []
+
+
+def test_state_is_quantized_and_clamped():
+    data = codec.decode_state(codec.encode_state(dict(STATE, x=40000, gun_angle=12.3456, image=1.26, bullets=[])))
+    assert data["x"] == 32767
+    assert data["gun_angle"] == 12.35
+    assert data["image"] == 1.2
+
+
+def test_state_rejects_bad_input():
+    raw = codec.encode_state(dict(STATE, game_over="Player 1"))
+    for broken in truncations(raw) + [raw + b"\0", with_version(raw, codec.VERSION + 1), b"", raw[:1]]:
+        with pytest.raises(codec.CodecError):
+            codec.decode_state(broken)
+        with pytest.raises(codec.CodecError):
+            codec.check_state(broken)
+    with pytest.raises(codec.CodecError):
+        codec.decode_state(codec.encode_quit())
+
+
+def test_input_round_trip():
+    assert codec.decode_input(codec.encode_input(42, 0b10101, 33.33, 17)) == {
+        "seq": 42, "buttons": 0b10101, "gun_angle": 33.33, "world_ack": 17}
+    with pytest.raises(codec.CodecError):
+        codec.decode_input(codec.encode_input(42, 0, 0)[:-1])
+
+
+def test_world_round_trip():
+    for tick in range(0, 1000, 7):
+        tick, players, bullets, winner = world(tick)
+        raw = codec.encode_world(tick, 9, players, bullets, winner)
+        assert codec.decode_world(raw) == decoded(tick, players, bullets, winner, ack=9)
+        # Quantized players encode the same
+        assert codec.encode_world(tick, 9, quantized(players), bullets, winner) == raw
+
+
+def test_delta_round_trip():
+    # Each tick is sent as a delta against a random recent baseline, the way
+    # the server picks whatever the client last confirmed
+    rng = random.Random(1)
+    decoder = codec.WorldDecoder()
+    tick, players, bullets, winner = world(0)
+    decoder.decode(codec.encode_world(tick, 0, players, bullets, winner))
+    for tick in range(1, 1000):
+        baseline_tick = max(0, tick - rng.randrange(1, 40))
+        baseline = quantized(world(baseline_tick)[1])
+        tick, players, bullets, winner = world(tick)
+        raw = codec.encode_world_delta(tick, 3, quantized(players), baseline_tick, baseline, bullets, winner)
+        assert decoder.decode(raw) == decoded(tick, players, bullets, winner, ack=3)
+
+
+def test_unchanged_delta_is_just_the_masks():
+    players = quantized(world(10)[1])
+    raw = codec.encode_world_delta(11, 0, players, 10, players, [])
+    assert len(raw) == codec.HEADER.size + codec.WORLD_DELTA.size + 2 * codec.DELTA_MASK.size
+
+
+def test_delta_rejects_bad_input():
+    tick0, players0, _, _ = world(0)
+    tick1, players1, bullets, _ = world(1)
+    raw = codec.encode_world_delta(tick1, 0, quantized(players1), tick0, quantized(players0), bullets, "Player 2")
+
+    with pytest.raises(codec.CodecError):
+        codec.WorldDecoder().decode(raw)  # baseline never received
+
+    for broken in truncations(raw) + [raw + b"\0", with_version(raw, codec.VERSION - 1)]:
+        decoder = codec.WorldDecoder()
+        decoder.decode(codec.encode_world(tick0, 0, players0, []))
+        with pytest.raises(codec.CodecError):
+            decoder.decode(broken)
+
+    full = codec.encode_world(tick1, 0, players1, bullets, "Player 2")
+    for broken in truncations(full) + [full + b"\0", with_version(full, 0), codec.encode_quit()]:
+        with pytest.raises(codec.CodecError):
+            codec.decode_world(broken)
+
+    with pytest.raises(codec.CodecError):
+        codec.encode_world_delta(tick0 + 300, 0, quantized(players1), tick0, quantized(players0), [])
+
+
+def test_old_baselines_are_forgotten():
+    decoder = codec.WorldDecoder(history_size=8)
+    for tick in range(20):
+        decoder.decode(codec.encode_world(tick, 0, world(tick)[1], []))
+    players = quantized(world(20)[1])
+    with pytest.raises(codec.CodecError):
+        decoder.decode(codec.encode_world_delta(20, 0, players, 5, quantized(world(5)[1]), []))
+    assert decoder.decode(codec.encode_world_delta(20, 0, players, 19, quantized(world(19)[1]), []))["tick"] == 20
+
+
+def test_hello_and_input_bundle_round_trip():
+    assert codec.decode_hello(codec.encode_hello(0xDEADBEEF)) == 0xDEADBEEF
+    commands = [(1, 2, -90.5, 0), (2, 18, 179.99, 1), (3, 0, 0.0, 1)]
+    assert codec.decode_input_bundle(codec.encode_input_bundle(commands)) == [
+        {"seq": s, "buttons": b, "gun_angle": a, "world_ack": w} for s, b, a, w in commands]
+    for broken in truncations(codec.encode_input_bundle(commands)):
+        with pytest.raises(codec.CodecError):
+            codec.decode_input_bundle(broken)
+    with pytest.raises(codec.CodecError):
+        codec.decode_hello(codec.encode_hello(1)[:-1])
+
+
+def test_world_player_keeps_sub_pixels():
+    # Client prediction replays from the fractions, a pixel lost here is a misprediction
+    for sub in (-0.5, -0.33333, 0.0, 0.0001, 0.49999):
+        values = codec.quantize_world_player(dict(PLAYER, sub_x=sub, sub_y=-sub))
+        data = codec.dequantize_world_player(values)
+        assert data["sub_x"] == pytest.approx(sub, abs=0.5 / codec.SUBPIXEL_SCALE)
+        assert data["sub_y"] == pytest.approx(-sub, abs=0.5 / codec.SUBPIXEL_SCALE)
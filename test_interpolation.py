@@ -0,0 +1,36 @@
+# test_interpolation.py
+import pytest
+
+from interpolation import SnapshotBuffer
+
+LATENCY = 0.02
+
+
+def snapshot(sender_time):
+    # A player standing still and one bullet flying right at 600 px/s
+    return {"x": 100, "y": 200, "gun_angle": 0.0,
+            "bullets": [{"id": 1, "x": 300 + 600 * sender_time, "y": 400, "target": (1280, 400), "source_id": 1}]}
+
+
+def filled_buffer():
+    buffer = SnapshotBuffer(delay=0.1, max_extrapolation=0.25)
+    for sender_time in (1.0, 1.05, 1.1):
+        buffer.add(sender_time, snapshot(sender_time), sender_time + LATENCY)
+    return buffer
+
+
+def test_drawing_is_delayed():
+    buffer = filled_buffer()
+    bullet = buffer.sample(1.1 + LATENCY)["bullets"][0]
+    assert bullet["x"] == pytest.approx(300 + 600 * 1.0)
+
+
+def test_now_extrapolates_the_newest_snapshots():
+    # Hit tests run against this, not against the drawn past
+    buffer = filled_buffer()
+    bullet = buffer.sample(1.15 + LATENCY, delay=0)["bullets"][0]
+    assert bullet["x"] == pytest.approx(300 + 600 * 1.15)
+
+    # Past max_extrapolation the bullet stops where the estimate ran out
+    bullet = buffer.sample(2.0 + LATENCY, delay=0)["bullets"][0]
+    assert bullet["x"] == pytest.approx(300 + 600 * 1.35)
@@ -0,0 +1,73 @@
+# test_protocol.py
+# Framing over a loopback socket pair.
+import socket
+import threading
+
+import pytest
+
+import protocol
+
+
+@pytest.fixture
+def pair():
+    left, right = socket.socketpair()
+    yield left, right
+    left.close()
+    right.close()
+
+
+def test_round_trip(pair):
+    left, right = pair
+    sender, receiver = protocol.Protocol(left), protocol.Protocol(right)
+    for message in (b"hello", b"", bytes(range(256)) * 50):  # the last one is past the old 9999 byte cap
+        sender.send_data(message)
+        assert receiver.get_data() == message
+
+
+def test_several_frames_from_one_recv(pair):
+    left, right = pair
+    messages = [b"a" * n for n in range(1, 20)]
+    left.sendall(b"".join(protocol.HEADER.pack(len(m)) + m for m in messages))
+    receiver = protocol.Protocol(right)
+    assert receiver.get_all_data() == messages
+
+
+def test_short_reads(pair):
+    # One byte per send, so every recv returns a piece of a frame
+    left, right = pair
+    messages = [b"first", b"x" * 300, b"third"]
+    stream = b"".join(protocol.HEADER.pack(len(m)) + m for m in messages)
+
+    def dribble():
+        for i in range(len(stream)):
+            left.send(stream[i:i + 1])
+
+    thread = threading.Thread(target=dribble)
+    thread.start()
+    receiver = protocol.Protocol(right)
+    assert [receiver.get_data() for _ in messages] == messages
+    thread.join()
+
+
+def test_small_buffer_wraps_and_grows(pair):
+    left, right = pair
+    sender, receiver = protocol.Protocol(left), protocol.Protocol(right, buffer_size=16)
+    messages = [bytes([i]) * (i * 7 % 40) for i in range(60)]
+    for message in messages:
+        sender.send_data(message)
+    assert [receiver.get_data() for _ in messages] == messages
+
+
+def test_closed_connection(pair):
+    left, right = pair
+    protocol.Protocol(left).send_data(b"last")
+    left.close()
+    receiver = protocol.Protocol(right)
+    assert receiver.get_data() == b"last"
+    assert receiver.get_data() is None
+
+
+def test_oversized_length_is_rejected(pair):
+    left, right = pair
+    left.sendall(protocol.HEADER.pack(protocol.MAX_MESSAGE_SIZE + 1))
+    assert protocol.Protocol(right).get_data() is None
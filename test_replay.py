@@ -0,0 +1,133 @@
+# test_replay.py
+# Recordings read back in order, by seeking and after a crash.
+import random
+
+import pytest
+
+import codec
+from replay import Recorder, ReplayError, ReplayReader
+
+PLAYER = {
+    "x": 150,
+    "y": 100,
+    "vy": 0.0,
+    "lives": 3,
+    "ammo": 3,
+    "image": 0.0,
+    "facing_right": True,
+    "gun_angle": 0.0,
+    "alive": True,
+    "respawn_timer": 0,
+    "can_dash": True,
+    "on_ground": True,
+    "jump_key_held": False,
+    "dash_cooldown": 0,
+    "ammo_timer": 0,
+    "jump_count": 0,
+    "sub_x": 0.0,
+    "sub_y": 0.0,
+}
+
+
+def world(tick):
+    # (tick, players, bullets, winner) with values the wire format holds exactly
+    players = [dict(PLAYER, x=150 + i * 900 + tick % 300, y=100 + tick % 11, vy=(tick % 9 - 4) / 4,
+                    ammo=tick // 40 % 4, gun_angle=tick % 360 - 180.5, alive=tick % 200 < 180,
+                    sub_y=(tick % 4 - 2) / 8)
+               for i in range(2)]
+    bullets = [{"id": tick // 10 + i, "x": tick % 500 + i * 30, "y": 300, "target": (640, 360), "source_id": i % 2}
+               for i in range(tick % 4)]
+    return tick, players, bullets, "Player 1" if tick % 97 == 0 else None
+
+
+def expected(tick, players, bullets, winner):
+    data = {"tick": tick, "ack": 0, "players": players, "bullets": bullets}
+    if winner is not None:
+        data["game_over"] = winner
+    return data
+
+
+def record(path, ticks, keyframe_interval=60, flush_size=1024):
+    recorder = Recorder(str(path), keyframe_interval=keyframe_interval, flush_size=flush_size)
+    for tick in ticks:
+        recorder.record(*world(tick))
+    recorder.close()
+
+
+def test_play_forward(tmp_path):
+    path = tmp_path / "match.replay"
+    record(path, range(1, 500))
+    reader = ReplayReader(str(path))
+    try:
+        assert len(reader) == 499
+        for i in range(len(reader)):
+            assert reader.world(i) == expected(*world(i + 1))
+    finally:
+        reader.close()
+
+
+def test_seek(tmp_path):
+    path = tmp_path / "match.replay"
+    ticks = list(range(1, 300)) + list(range(310, 600))  # the recorder may skip ticks
+    record(path, ticks)
+    reader = ReplayReader(str(path))
+    try:
+        rng = random.Random(4)
+        for tick in rng.sample(ticks, 100):
+            assert reader.world_at(tick) == expected(*world(tick))
+        assert reader.world_at(305)["tick"] == 299  # the last record at or before
+        assert reader.world(len(reader) - 1) == expected(*world(599))
+        with pytest.raises(IndexError):
+            reader.world(len(reader))
+    finally:
+        reader.close()
+
+
+def test_repeated_ticks_are_recorded_once(tmp_path):
+    path = tmp_path / "match.replay"
+    record(path, [1, 2, 3, 3, 3, 4])  # a finished match holds its tick
+    reader = ReplayReader(str(path))
+    try:
+        assert list(reader.ticks) == [1, 2, 3, 4]
+    finally:
+        reader.close()
+
+
+def test_without_index(tmp_path):
+    # A recorder that died leaves no index and maybe half a record, the
+    # reader rebuilds the index from the records that are whole
+    path = tmp_path / "match.replay"
+    record(path, range(1, 200))
+    reader = ReplayReader(str(path))
+    last_offset = int(reader.offsets[-1])
+    reader.close()
+    path.write_bytes(path.read_bytes()[:last_offset + 5])
+
+    reader = ReplayReader(str(path))
+    try:
+        assert len(reader) == 198
+        assert reader.world_at(198) == expected(*world(198))
+        assert reader.world_at(61) == expected(*world(61))
+    finally:
+        reader.close()
+
+
+def test_not_a_replay(tmp_path):
+    path = tmp_path / "bad.replay"
+    for data in (b"", b"SB", b"XXXX" + bytes(20)):
+        path.write_bytes(data)
+        with pytest.raises(ReplayError):
+            ReplayReader(str(path))
+
+
+def test_records_are_world_messages(tmp_path):
+    # Keyframes are full snapshots, the rest deltas against the tick before
+    path = tmp_path / "match.replay"
+    record(path, range(1, 130), keyframe_interval=60)
+    reader = ReplayReader(str(path))
+    try:
+        types = [codec.message_type(reader.raw(i)) for i in range(len(reader))]
+        assert [i for i, t in enumerate(types) if t == codec.MSG_WORLD] == [0, 60, 120]
+        assert types.count(codec.MSG_WORLD_DELTA) == len(reader) - 3
+    finally:
+        reader.close()
@@ -0,0 +1,79 @@
+# test_server.py
+# The authoritative room without sockets: inputs go straight into its
+# queues and worlds come back through the codec.
+import random
+from collections import deque
+
+import codec
+from match import step_player
+from server import SimRoom
+from simulation import SimPlayer
+
+BUTTONS = (0, codec.INPUT_LEFT, codec.INPUT_RIGHT, codec.INPUT_JUMP, codec.INPUT_LEFT | codec.INPUT_JUMP,
+           codec.INPUT_RIGHT | codec.INPUT_JUMP, codec.INPUT_DASH)
+
+
+class PredictingClient:
+    # What GameClient does with prediction on: step every input locally,
+    # then rewind to each world and replay the inputs it hasn't acked
+    def __init__(self, room, player_id):
+        self.room = room
+        self.player_id = player_id
+        self.player = SimPlayer(0, 0)
+        self.player.set_data(room.match.players[player_id].get_data())
+        self.history = deque()
+        self.seq = 0
+        self.corrections = 0
+
+    def send_input(self, buttons):
+        self.seq += 1
+        self.history.append((self.seq, buttons))
+        step_player(self.player, self.room.match.collision_blocks, buttons)
+        return {"seq": self.seq, "buttons": buttons, "gun_angle": 0.0, "world_ack": 0}
+
+    def receive_world(self):
+        world = codec.decode_world(codec.encode_world(self.room.match.tick, self.room.acks[self.player_id],
+                                                      self.room.match.get_players_data(), []))
+        predicted = self.player.rect.topleft, self.player.vy
+        while self.history and self.history[0][0] <= world["ack"]:
+            self.history.popleft()
+        self.player.set_data(world["players"][self.player_id])
+        for seq, buttons in self.history:
+            step_player(self.player, self.room.match.collision_blocks, buttons)
+        if (self.player.rect.topleft, self.player.vy) != predicted:
+            self.corrections += 1
+
+
+def test_every_input_runs_once():
+    room = SimRoom(0)
+    for seq in range(1, 11):
+        room.receive_inputs(0, [{"seq": seq, "buttons": codec.INPUT_RIGHT, "gun_angle": 0.0, "world_ack": 0}])
+    x = room.match.players[0].rect.x
+    ran = []
+    while room.pending_inputs[0]:
+        commands = room.next_inputs(0)
+        ran += [command["seq"] for command in commands]
+        assert room.acks[0] == ran[-1]
+        room.match.step([commands, []])
+        assert len(room.pending_inputs[0]) < room.MAX_PENDING_INPUTS
+    assert ran == list(range(1, 11))
+    assert room.next_inputs(0) == []  # nothing new, nothing repeated
+    assert room.acks[0] == 10
+    assert room.match.players[0].rect.x > x
+
+
+def test_prediction_survives_hiccups():
+    # Inputs reach the server late, in bursts or not at all for a while
+    room = SimRoom(0)
+    client = PredictingClient(room, 0)
+    rng = random.Random(7)
+    in_flight = deque()
+    for _ in range(3000):
+        in_flight.append(client.send_input(rng.choice(BUTTONS)))
+        delivered = rng.choice((0, 1, 1, 1, 2, 3)) if rng.random() > 0.02 else 0
+        if rng.random() < 0.01:
+            delivered = len(in_flight)  # a burst after a stall
+        room.receive_inputs(0, [in_flight.popleft() for _ in range(min(delivered, len(in_flight)))])
+        room.match.step([room.next_inputs(0), room.next_inputs(1)])
+        client.receive_world()
+    assert client.corrections == 0
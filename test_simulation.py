@@ -0,0 +1,46 @@
+# test_simulation.py
+# Player movement against a small hand made level.
+import codec
+from simulation import PLAYER_SIZE, Box, LevelIndex, SimPlayer, push_out, sweep
+
+FLOOR = Box(0, 500, 1000, 40)
+WALL = Box(600, 300, 40, 200)
+
+
+def level():
+    return LevelIndex([FLOOR, WALL])
+
+
+def test_sweep_stops_flush():
+    blocks = level()
+    rect = Box(500, 500 - PLAYER_SIZE[1], *PLAYER_SIZE)
+    moved, block = sweep(rect, blocks, dx=200)
+    assert block is WALL and rect.right + moved == WALL.x
+    moved, block = sweep(rect, blocks, dy=50)
+    assert block is FLOOR and moved == 0
+
+
+def test_push_out_takes_the_shortest_way():
+    blocks = level()
+    sunk = Box(100, FLOOR.y - PLAYER_SIZE[1] + 10, *PLAYER_SIZE)
+    push_out(sunk, blocks)
+    assert sunk.bottom == FLOOR.y and sunk.x == 100
+    in_wall = Box(WALL.right - 5, 350, *PLAYER_SIZE)
+    push_out(in_wall, blocks)
+    assert in_wall.x == WALL.right and in_wall.y == 350
+
+
+def test_embedded_player_does_not_pass_through():
+    # Starting inside the floor the player used to skip it and fall out of
+    # the level, starting inside the wall it walked straight through
+    blocks = level()
+    player = SimPlayer(100, FLOOR.y - PLAYER_SIZE[1] + 10)
+    for _ in range(120):
+        player.step(blocks, 0)
+    assert player.rect.bottom == FLOOR.y and player.on_ground
+
+    player = SimPlayer(WALL.x - PLAYER_SIZE[0] + 5, FLOOR.y - PLAYER_SIZE[1])
+    for _ in range(120):
+        player.step(blocks, codec.INPUT_RIGHT)
+    assert player.rect.right == WALL.x
+    assert player.rect.bottom == FLOOR.y
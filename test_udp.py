@@ -0,0 +1,133 @@
+# test_udp.py
+# The UDP transport end to end over loopback: a real server on an event
+# loop thread, clients that speak the TCP handshake and then UDP.
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+import codec
+import protocol
+from server import AsyncGameServer
+
+TIMEOUT = 5.0
+
+
+def free_port():
+    with socket.socket() as tcp, socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+        tcp.bind(("127.0.0.1", 0))
+        port = tcp.getsockname()[1]
+        udp.bind(("127.0.0.1", port))  # the server needs both
+        return port
+
+
+@pytest.fixture
+def server():
+    port = free_port()
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(AsyncGameServer("127.0.0.1", port, udp=True).serve())
+    thread = threading.Thread(target=loop.run_until_complete, args=(asyncio.wait([task]),), daemon=True)
+    thread.start()
+    yield port
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(TIMEOUT)
+
+
+def connect(port):
+    deadline = time.monotonic() + TIMEOUT
+    while True:
+        try:
+            return socket.create_connection(("127.0.0.1", port), timeout=TIMEOUT)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.02)
+
+
+class Client:
+    def __init__(self, port):
+        self.tcp = connect(port)
+        self.pro = protocol.Protocol(self.tcp)
+        self.player_id = int(self.pro.get_data())
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.settimeout(TIMEOUT)
+        self.udp.connect(("127.0.0.1", port))
+        self.decoder = codec.WorldDecoder()
+
+    def start(self):
+        signal = self.pro.get_data().split()
+        assert signal[:3] == [b"start", b"auth", b"udp"]
+        self.token = int(signal[3])
+
+    def send_inputs(self, commands):
+        self.udp.send(codec.encode_input_bundle(commands))
+
+    def world(self):
+        return self.decoder.decode(self.udp.recv(65535))
+
+    def close(self):
+        self.tcp.close()
+        self.udp.close()
+
+
+@pytest.fixture
+def clients(server):
+    clients = [Client(server), Client(server)]
+    for client in clients:
+        client.start()
+    yield clients
+    for client in clients:
+        client.close()
+
+
+def wait_for_ack(client, ack):
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        world = client.world()
+        assert world["ack"] <= ack
+        if world["ack"] == ack:
+            return world
+    raise AssertionError(f"ack {ack} never arrived")
+
+
+def test_hello_then_worlds(clients):
+    for client in clients:
+        client.udp.send(codec.encode_hello(client.token))
+    for client in clients:
+        world = client.world()
+        assert len(world["players"]) == 2
+        assert world["ack"] == 0
+
+
+def test_bundles_are_sequenced(clients):
+    client = clients[0]
+    client.udp.send(codec.encode_hello(client.token))
+    x = client.world()["players"][client.player_id]["x"]
+
+    # Every datagram repeats the last three inputs, duplicates are dropped
+    sent = []
+    for seq in range(1, 31):
+        sent = (sent + [(seq, codec.INPUT_RIGHT, 0.0, 0)])[-3:]
+        client.send_inputs(sent)
+        time.sleep(0.005)
+    world = wait_for_ack(client, 30)
+    assert world["players"][client.player_id]["x"] > x
+
+    # Stale and reordered datagrams don't move the ack back
+    client.send_inputs([(5, 0, 0.0, 0), (6, 0, 0.0, 0)])
+    for _ in range(10):
+        assert client.world()["ack"] == 30
+
+
+def test_unknown_token_is_ignored(server, clients):
+    stranger = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    stranger.settimeout(0.3)
+    stranger.connect(("127.0.0.1", server))
+    stranger.send(codec.encode_hello(clients[0].token ^ 1))
+    stranger.send(codec.encode_input_bundle([(1, codec.INPUT_FIRE, 0.0, 0)]))
+    stranger.send(b"garbage")
+    with pytest.raises(socket.timeout):
+        stranger.recv(65535)
+    stranger.close()
@@ -0,0 +1,31 @@
+# timestep.py
+import settings
+
+
+class FixedTimestep:
+    # Turns real frame times into whole simulation ticks. What is left over
+    # stays in the accumulator, and alpha (0..1) says how far the next tick
+    # is along so renderers can draw between the last two ticks.
+    # Headless callers skip this and step the simulation as fast as they like.
+    def __init__(self, rate=settings.TICK_RATE, max_ticks=settings.MAX_TICKS_PER_FRAME):
+        self.dt = 1 / rate
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+        self.dropped = 0  # ticks given up after stalls
+
+    def advance(self, elapsed):
+        # Number of ticks to run for `elapsed` seconds of real time
+        self.accumulator += elapsed
+        count = int(self.accumulator / self.dt)
+        if count > self.max_ticks:
+            # A stall (window drag, breakpoint): don't spiral trying to catch up
+            self.dropped += count - self.max_ticks
+            count = self.max_ticks
+            self.accumulator = self.accumulator % self.dt + count * self.dt
+        self.accumulator -= count * self.dt
+        return count
+
+    @property
+    def alpha(self):
+        return min(self.accumulator / self.dt, 1.0)
+